@@ -0,0 +1,160 @@
+import copy
+import io
+import json
+import os
+import struct
+import tarfile
+import zipfile
+from Codec import ZLIB_LEVEL, HatError, open_meta_column, decode_meta_values, encode_meta_png
+
+
+TAR_COMPRESSIONS = {".gz": "gz", ".tgz": "gz", ".bz2": "bz2", ".xz": "xz"}
+
+
+def is_archive(path):
+    return os.path.isfile(path) and (zipfile.is_zipfile(path) or tarfile.is_tarfile(path))
+
+
+def is_hat_name(name: str):
+    return name.lower().endswith(".png")
+
+
+def iter_members(path):
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not is_hat_name(info.filename): continue
+                yield info.filename, archive.read(info)
+        return
+
+    with tarfile.open(path, 'r|*') as archive:
+        for member in archive:
+            if not member.isfile() or not is_hat_name(member.name): continue
+            yield member.name, archive.extractfile(member).read()
+
+
+def iter_archive_hats(path):
+    for name, data in iter_members(path):
+        try:
+            yield name, decode_meta_values(open_meta_column(io.BytesIO(data))), None
+        except (HatError, OSError) as error:
+            yield name, None, str(error)
+
+
+class ArchiveIndex:
+    def __init__(self, archive=""):
+        self.archive = archive
+        self.hats = []
+        self.errors = {}
+        self.types = {}
+        self.ranges = {}
+
+    def add(self, name: str, meta_values):
+        hat = len(self.hats)
+        self.hats.append(name)
+        for meta_pixel_type, g, b, values in meta_values:
+            hats = self.types.setdefault(meta_pixel_type.name, [])
+            if not hats or hats[-1] != hat: hats.append(hat)
+            if not values: continue
+
+            ranges = self.ranges.get(meta_pixel_type.name)
+            if ranges is None:
+                self.ranges[meta_pixel_type.name] = [[value, value] for value in values]
+                continue
+            for value_range, value in zip(ranges, values):
+                if value < value_range[0]: value_range[0] = value
+                elif value_range[1] < value: value_range[1] = value
+
+    def add_error(self, name: str, error: str):
+        self.errors[name] = error
+
+    def find(self, meta_pixel_type):
+        return [self.hats[hat] for hat in self.types.get(meta_pixel_type.name, ())]
+
+    def save(self, path):
+        with open(path, 'w') as file:
+            json.dump({"archive": self.archive, "hats": self.hats, "errors": self.errors, "types": self.types,
+                       "ranges": self.ranges}, file, separators=(",", ":"))
+
+    @staticmethod
+    def load(path):
+        with open(path) as file:
+            data = json.load(file)
+        index = ArchiveIndex(data["archive"])
+        index.hats = data["hats"]
+        index.errors = data["errors"]
+        index.types = data["types"]
+        index.ranges = data["ranges"]
+        return index
+
+
+def index_archive(path):
+    index = ArchiveIndex(os.path.basename(path))
+    for name, meta_values, error in iter_archive_hats(path):
+        if error is None: index.add(name, meta_values)
+        else: index.add_error(name, error)
+    return index
+
+
+def rewrite_hat(data: bytes, meta_pixels, level=ZLIB_LEVEL):
+    try:
+        rewritten = encode_meta_png(data, meta_pixels, level)
+    except (HatError, OSError):
+        return None
+    return None if rewritten is data else rewritten
+
+
+def copy_zip_member(archive, output, info):
+    if not all(hasattr(output, name) for name in ("fp", "start_dir", "filelist", "NameToInfo")):
+        output.writestr(info, archive.read(info))
+        return
+    archive.fp.seek(info.header_offset)
+    name_length, extra_length = struct.unpack('<HH', archive.fp.read(30)[26:30])
+    archive.fp.seek(info.header_offset+30+name_length+extra_length)
+    raw = archive.fp.read(info.compress_size)
+
+    copied = copy.copy(info)
+    copied.flag_bits &= ~0x08
+    output.fp.seek(output.start_dir)
+    copied.header_offset = output.fp.tell()
+    output.fp.write(copied.FileHeader())
+    output.fp.write(raw)
+    output.start_dir = output.fp.tell()
+    output.filelist.append(copied)
+    output.NameToInfo[copied.filename] = copied
+    output._didModify = True
+
+
+def rewrite_archive(source, target, edit, level=ZLIB_LEVEL):
+    changed = 0
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive, zipfile.ZipFile(target, 'w') as output:
+            for info in archive.infolist():
+                meta_pixels = None
+                if not info.is_dir() and is_hat_name(info.filename): meta_pixels = edit(info.filename)
+                rewritten = None if meta_pixels is None else rewrite_hat(archive.read(info), meta_pixels, level)
+                if rewritten is None:
+                    copy_zip_member(archive, output, info)
+                    continue
+                output.writestr(info, rewritten)
+                changed += 1
+        return changed
+
+    compression = TAR_COMPRESSIONS.get(os.path.splitext(target)[1].lower(), "")
+    with tarfile.open(source, 'r|*') as archive, tarfile.open(target, 'w|'+compression) as output:
+        for member in archive:
+            if not member.isfile():
+                output.addfile(member)
+                continue
+            meta_pixels = edit(member.name) if is_hat_name(member.name) else None
+            if meta_pixels is None:
+                output.addfile(member, archive.extractfile(member))
+                continue
+            data = archive.extractfile(member).read()
+            rewritten = rewrite_hat(data, meta_pixels, level)
+            if rewritten is not None:
+                data = rewritten
+                member.size = len(data)
+                changed += 1
+            output.addfile(member, io.BytesIO(data))
+    return changed
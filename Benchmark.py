@@ -0,0 +1,263 @@
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import time
+import timeit
+from PIL import Image
+from MetaPixels import ValueType, MetaPixelType, MetaPixel
+from Codec import HAT_SIZE, META_ROWS, decode_meta_column, decode_meta_values, encode_meta_column, \
+    read_meta_column, encode_meta_png
+
+
+IMPORT_BUDGETS = {
+    "MetaPixels": 0.04,
+    "Codec": 0.08,
+    "HatTools": 0.2,
+    "Editor": 0.2
+}
+LAZY_IMPORTS = {
+    "MetaPixels": ("PIL", "tkinter", "numpy"),
+    "Codec": ("PIL", "tkinter", "numpy"),
+    "HatTools": ("PIL", "tkinter", "numpy"),
+    "Editor": ("PIL", "numpy")
+}
+
+
+def make_meta_pixels(count: int, seed=0):
+    rng = random.Random(seed)
+    types = [meta_pixel_type for meta_pixel_type in MetaPixelType if meta_pixel_type.value[0] < 100]
+    randomize = [meta_pixel_type for meta_pixel_type in MetaPixelType if 100 <= meta_pixel_type.value[0]]
+    rng.shuffle(types)
+    types = types[:count]+[rng.choice(randomize) for _ in range(count-len(types))]
+    return [MetaPixel(meta_pixel_type, rng.randrange(256), rng.randrange(256)) for meta_pixel_type in types]
+
+
+def make_hat(count: int, seed=0):
+    rng = random.Random(seed)
+    image = Image.frombytes('RGBA', HAT_SIZE, bytes(rng.getrandbits(8) for _ in range(HAT_SIZE[0]*HAT_SIZE[1]*4)))
+    encode_meta_column(image, make_meta_pixels(count, seed))
+    return image
+
+
+def measure(function, number: int, repeat=5):
+    times = timeit.Timer(function).repeat(repeat, number)
+    return {"number": number, "best": min(times)/number, "mean": sum(times)/len(times)/number}
+
+
+def codec_benchmarks():
+    image = make_hat(META_ROWS)
+    data = read_meta_column(image)
+    meta_pixels = make_meta_pixels(META_ROWS)
+    png = io.BytesIO()
+    image.save(png, format="PNG")
+    png = png.getvalue()
+    changed = make_meta_pixels(META_ROWS, 1)
+    return [
+        ("codec.decode_meta_column", lambda: decode_meta_column(image), 2000),
+        ("codec.decode_meta_values", lambda: decode_meta_values(data), 2000),
+        ("codec.encode_meta_column", lambda: encode_meta_column(image, meta_pixels), 2000),
+        ("codec.encode_meta_png", lambda: encode_meta_png(png, changed), 100),
+        ("codec.encode_meta_png_unchanged", lambda: encode_meta_png(png, meta_pixels), 100)
+    ]
+
+
+def value_benchmarks():
+    benchmarks = []
+    for value_type in ValueType:
+        meta_pixel_type = next(t for t in MetaPixelType if t.value[1].type == value_type)
+        meta_pixel = MetaPixel(meta_pixel_type, 0, 0)
+
+        def round_trip(meta_pixel=meta_pixel):
+            for c in range(256):
+                meta_pixel.set_colors(c, 255-c)
+                meta_pixel.set_value(*(meta_pixel.get_value()+(0.0, 0.0))[:2])
+                meta_pixel.get_rgba()
+        benchmarks.append(("value."+value_type.name, round_trip, 50))
+    return benchmarks
+
+
+def import_time(module: str, repeat=5):
+    times = []
+    modules = set()
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-X", "importtime", "-c", "import "+module], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stderr
+        cumulative = {}
+        for line in output.splitlines():
+            fields = line[len("import time:"):].split("|")
+            if not line.startswith("import time:") or len(fields) != 3 or not fields[1].strip().isdigit(): continue
+            cumulative[fields[2].strip()] = int(fields[1])
+        if module not in cumulative: raise RuntimeError("Couldn't import "+module+":\n"+output)
+        times.append(cumulative[module]/1e6)
+        modules = set(cumulative)
+    return {"number": 1, "best": min(times), "mean": sum(times)/len(times)}, modules
+
+
+def import_benchmarks():
+    results = {}
+    failures = 0
+    for module, budget in IMPORT_BUDGETS.items():
+        result, modules = import_time(module)
+        results["import."+module] = result
+        print("import."+module+": "+"{:.1f}".format(result["best"]*1e3)+" ms (budget "
+              + "{:.0f}".format(budget*1e3)+" ms)")
+        if budget < result["best"]:
+            print(module+" takes longer to import than its budget", file=sys.stderr)
+            failures += 1
+        for name in LAZY_IMPORTS[module]:
+            if name in modules:
+                print("Importing "+module+" also imports "+name, file=sys.stderr)
+                failures += 1
+    return results, failures
+
+
+def particle_benchmarks():
+    try:
+        from Particles import Emitter, ParticleSystem
+    except ImportError as error:
+        print("Skipping particle benchmarks: "+str(error), file=sys.stderr)
+        return []
+
+    benchmarks = []
+    for count in (1, 1000):
+        emitters = [Emitter.from_meta_pixels(make_meta_pixels(16, seed)+[MetaPixel(MetaPixelType.ParticleCount, 8, 0)])
+                    for seed in range(count)]
+        system = ParticleSystem(emitters, 0)
+        benchmarks.append(("particles.step."+str(count), system.step, 2000 if count == 1 else 50))
+        benchmarks.append(("particles.render."+str(count), system.render, 200 if count == 1 else 5))
+    return benchmarks
+
+
+def cape_benchmarks():
+    from Capes import CapeParameters, cape_geometry, cape_frames, render_cape
+    parameters = CapeParameters.from_meta_pixels([MetaPixel(MetaPixelType.CapeOffset, 128, 140),
+                                                  MetaPixel(MetaPixelType.CapeTaperStart, 100, 0)])
+    geometry_key, style_key = parameters.geometry_key(), parameters.style_key()
+    hat = make_meta_pixels(16)
+    render_cape(CapeParameters.from_meta_pixels(hat))
+    return [("capes.geometry", lambda: cape_geometry.__wrapped__(*geometry_key), 50),
+            ("capes.style", lambda: cape_frames.__wrapped__(geometry_key, style_key), 100),
+            ("capes.cached", lambda: render_cape(CapeParameters.from_meta_pixels(hat)), 1000)]
+
+
+def thumbnail_benchmarks():
+    try:
+        import numpy
+        from Thumbnails import recolor
+    except ImportError as error:
+        print("Skipping thumbnail benchmarks: "+str(error), file=sys.stderr)
+        return []
+
+    pixels = numpy.random.default_rng(0).choice([0, 157, 255], size=(META_ROWS, 96, 4)).astype(numpy.uint8)
+    return [("thumbnails.recolor", lambda: recolor(pixels), 1000)]
+
+
+def start_display():
+    if os.environ.get("DISPLAY") or sys.platform in ("win32", "darwin"): return None
+    xvfb = shutil.which("Xvfb")
+    if xvfb is None: return None
+    process = subprocess.Popen([xvfb, ":99", "-nolisten", "tcp"], stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    os.environ["DISPLAY"] = ":99"
+    time.sleep(1)
+    return process
+
+
+def gui_benchmarks():
+    import tkinter as tk
+    try:
+        from Editor import Editor
+        editor = Editor(mainloop=False)
+    except tk.TclError as error:
+        print("Skipping GUI benchmarks: "+str(error), file=sys.stderr)
+        return [], None
+
+    def show(meta_pixels):
+        editor.meta_pixels = meta_pixels
+        editor.meta_pixel_keys = [meta_pixel.type for meta_pixel in meta_pixels]
+        editor.gen_meta_pixels()
+        editor.root.update()
+
+    benchmarks = []
+    for count in (1, 16, 56):
+        hats = [make_meta_pixels(count, seed) for seed in range(2)]
+
+        def build(hats=hats):
+            show([])
+            show(hats[0])
+
+        def reload(hats=hats):
+            show(hats[0])
+            show(hats[1])
+        benchmarks.append(("gui.gen_meta_pixels."+str(count)+".build", build, 5))
+        benchmarks.append(("gui.gen_meta_pixels."+str(count)+".reload", reload, 5))
+
+    def scroll(hat=make_meta_pixels(META_ROWS)):
+        if editor.meta_pixels is not hat: show(hat)
+        for top in range(META_ROWS): editor.scroll_to(top)
+        editor.scroll_to(0)
+        editor.root.update()
+    benchmarks.append(("gui.scroll."+str(META_ROWS), scroll, 5))
+    return benchmarks, editor
+
+
+def compare(results, previous, tolerance: float):
+    regressions = 0
+    for name, result in results.items():
+        old = previous.get(name)
+        if old is None: continue
+        ratio = result["best"]/old["best"]
+        if tolerance < ratio:
+            print("Regression in "+name+": "+"{:.2f}".format(ratio)+"x slower", file=sys.stderr)
+            regressions += 1
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for the MetaPixel codec, values & editor GUI")
+    parser.add_argument("--output", default="benchmark.json", help="JSON file to write the results to")
+    parser.add_argument("--compare", help="Earlier results to compare against, exits with 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="Allowed slowdown ratio when comparing")
+    parser.add_argument("--no-gui", action="store_true", help="Skip the benchmarks that need a display")
+    parser.add_argument("--no-imports", action="store_true",
+                        help="Skip the import time budgets measured with python -X importtime")
+    arguments = parser.parse_args(argv)
+
+    results = {}
+    failures = 0
+    if not arguments.no_imports: results, failures = import_benchmarks()
+
+    benchmarks = codec_benchmarks()+value_benchmarks()+particle_benchmarks()+cape_benchmarks()+thumbnail_benchmarks()
+    display = None
+    editor = None
+    if not arguments.no_gui:
+        display = start_display()
+        gui, editor = gui_benchmarks()
+        benchmarks += gui
+
+    try:
+        for name, function, number in benchmarks:
+            results[name] = measure(function, number)
+            print(name+": "+"{:.1f}".format(results[name]["best"]*1e6)+" us")
+    finally:
+        if editor is not None: editor.root.destroy()
+        if display is not None: display.terminate()
+
+    with open(arguments.output, 'w') as file:
+        json.dump({"python": platform.python_version(), "platform": platform.platform(), "results": results}, file,
+                  indent=2)
+
+    if arguments.compare is not None:
+        with open(arguments.compare) as file:
+            failures += compare(results, json.load(file)["results"], arguments.tolerance)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+import hashlib
+import os
+import sqlite3
+from collections import OrderedDict
+from Codec import open_meta_column
+
+
+class MetaPixelCache:
+    COMMIT_EVERY = 256
+
+    def __init__(self, maxsize=4096, path=None, hash_content=False):
+        self.maxsize = maxsize
+        self.hash_content = hash_content
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.pending = 0
+        self.database = None
+        if path is not None:
+            self.database = sqlite3.connect(path)
+            self.database.execute("CREATE TABLE IF NOT EXISTS columns (key TEXT PRIMARY KEY, data BLOB NOT NULL)")
+
+    def key(self, path):
+        if self.hash_content:
+            with open(path, 'rb') as file:
+                return "sha1:"+hashlib.sha1(file.read()).hexdigest()
+        stat = os.stat(path)
+        return os.path.abspath(path)+"|"+str(stat.st_mtime_ns)+"|"+str(stat.st_size)
+
+    def get(self, key: str):
+        data = self.entries.get(key)
+        if data is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+        if self.database is not None:
+            row = self.database.execute("SELECT data FROM columns WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.hits += 1
+                self.remember(key, bytes(row[0]))
+                return self.entries[key]
+
+        self.misses += 1
+        return None
+
+    def remember(self, key: str, data: bytes):
+        self.entries[key] = data
+        self.entries.move_to_end(key)
+        while self.maxsize < len(self.entries): self.entries.popitem(last=False)
+
+    def put(self, key: str, data: bytes):
+        self.remember(key, data)
+        if self.database is None: return
+        self.database.execute("INSERT OR REPLACE INTO columns (key, data) VALUES (?, ?)", (key, data))
+        self.pending += 1
+        if self.COMMIT_EVERY <= self.pending: self.commit()
+
+    def get_column(self, path):
+        key = self.key(path)
+        data = self.get(key)
+        if data is None:
+            data = open_meta_column(path)
+            self.put(key, data)
+        return data
+
+    def commit(self):
+        if self.database is not None and self.pending: self.database.commit()
+        self.pending = 0
+
+    def close(self):
+        self.commit()
+        if self.database is not None: self.database.close()
+        self.database = None
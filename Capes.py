@@ -0,0 +1,118 @@
+import math
+from functools import lru_cache
+from MetaPixels import MetaPixelType, get_tables
+from Codec import meta_rows
+
+
+FRAMES = 120
+FRAME_SIZE = (96, 80)
+SEGMENTS = 12
+SEGMENT_LENGTH = 2.0
+CAPE_WIDTH = 8.0
+STIFFNESS = 0.5
+DUCK_SIZE = (16, 24)
+CAPE_COLOR = (200, 40, 40)
+
+DEFAULTS = {
+    MetaPixelType.CapeOffset: (0.0, 0.0),
+    MetaPixelType.CapeSwayModifier: (0.3, 1.0),
+    MetaPixelType.CapeWiggleModifier: (1.0, 1.0),
+    MetaPixelType.CapeTaperStart: (0.5,),
+    MetaPixelType.CapeTaperEnd: (1.0,),
+    MetaPixelType.CapeAlphaStart: (1.0,),
+    MetaPixelType.CapeAlphaEnd: (1.0,)
+}
+
+
+def duck_position(frame: int):
+    t = 2*math.pi*(frame % FRAMES)/FRAMES
+    return FRAME_SIZE[0]/2+24*math.sin(t), 28-8*max(0.0, math.sin(2*t))
+
+
+DUCK_PATH = tuple(duck_position(frame) for frame in range(FRAMES))
+
+
+class CapeParameters:
+    __slots__ = ("values", "trail", "foreground")
+
+    def __init__(self, rows):
+        self.values = dict(DEFAULTS)
+        self.trail = False
+        self.foreground = False
+        for meta_pixel_type, g, b in rows:
+            if meta_pixel_type in DEFAULTS: self.values[meta_pixel_type] = get_tables(meta_pixel_type).decode(g, b)
+            elif meta_pixel_type == MetaPixelType.CapeIsTrail: self.trail = True
+            elif meta_pixel_type == MetaPixelType.CapeForeground: self.foreground = True
+
+    @staticmethod
+    def from_meta_pixels(meta_pixels):
+        return CapeParameters((meta_pixel.type,)+meta_pixel.get_rgba()[1:3] for meta_pixel in meta_pixels)
+
+    @staticmethod
+    def from_column(data: bytes):
+        return CapeParameters(meta_rows(data))
+
+    def geometry_key(self):
+        return tuple(self.values[MetaPixelType.CapeOffset]), tuple(self.values[MetaPixelType.CapeSwayModifier]), \
+            tuple(self.values[MetaPixelType.CapeWiggleModifier]), self.trail
+
+    def style_key(self):
+        return self.values[MetaPixelType.CapeTaperStart][0], self.values[MetaPixelType.CapeTaperEnd][0], \
+            self.values[MetaPixelType.CapeAlphaStart][0], self.values[MetaPixelType.CapeAlphaEnd][0]
+
+
+@lru_cache(maxsize=64)
+def cape_geometry(offset, sway, wiggle, trail: bool):
+    length = SEGMENT_LENGTH*max(0.2, 1+sway[0])
+    spacing = max(1, round(2*(1+sway[0])))
+    points = [[DUCK_PATH[0][0]+offset[0], DUCK_PATH[0][1]+offset[1]+length*i] for i in range(SEGMENTS+1)]
+    frames = []
+    for frame in range(2*FRAMES):
+        x, y = DUCK_PATH[frame % FRAMES]
+        velocity = x-DUCK_PATH[(frame-1) % FRAMES][0]
+        points[0] = [x+offset[0], y+offset[1]]
+        for i in range(1, SEGMENTS+1):
+            wave = math.sin(frame*0.25+i*0.7)*i/SEGMENTS
+            if trail:
+                past_x, past_y = DUCK_PATH[(frame-i*spacing) % FRAMES]
+                points[i] = [past_x+offset[0], past_y+offset[1]+wiggle[1]*wave]
+                continue
+
+            previous = points[i-1]
+            target_x = previous[0]-velocity*sway[1]*0.5+wiggle[0]*wave*0.5
+            target_y = previous[1]+length+wiggle[1]*math.cos(frame*0.2+i)*0.25
+            point = points[i]
+            point[0] += (target_x-point[0])*STIFFNESS
+            point[1] += (target_y-point[1])*STIFFNESS
+            dx, dy = point[0]-previous[0], point[1]-previous[1]
+            distance = math.hypot(dx, dy) or 1.0
+            points[i] = [previous[0]+dx/distance*length, previous[1]+dy/distance*length]
+        if FRAMES <= frame: frames.append(tuple((point[0], point[1]) for point in points))
+    return tuple(frames)
+
+
+def lerp(start: float, end: float, t: float):
+    return start+(end-start)*t
+
+
+@lru_cache(maxsize=256)
+def cape_frames(geometry_key, style_key):
+    taper_start, taper_end, alpha_start, alpha_end = style_key
+    widths = [CAPE_WIDTH*lerp(taper_start, taper_end, i/SEGMENTS)/2 for i in range(SEGMENTS+1)]
+    alphas = [min(1.0, max(0.0, lerp(alpha_start, alpha_end, (i+0.5)/SEGMENTS))) for i in range(SEGMENTS)]
+
+    frames = []
+    for points in cape_geometry(*geometry_key):
+        segments = []
+        for i in range(SEGMENTS):
+            (x0, y0), (x1, y1) = points[i], points[i+1]
+            distance = math.hypot(x1-x0, y1-y0) or 1.0
+            nx, ny = (y0-y1)/distance, (x1-x0)/distance
+            segments.append(((x0+nx*widths[i], y0+ny*widths[i], x1+nx*widths[i+1], y1+ny*widths[i+1],
+                              x1-nx*widths[i+1], y1-ny*widths[i+1], x0-nx*widths[i], y0-ny*widths[i]), alphas[i]))
+        frames.append(tuple(segments))
+    return tuple(frames)
+
+
+def render_cape(parameters: CapeParameters):
+    return cape_frames(parameters.geometry_key(), parameters.style_key())
@@ -0,0 +1,252 @@
+import io
+import os
+import struct
+import tempfile
+import zlib
+from MetaPixels import MetaPixel, get_tables
+
+
+HAT_SIZE = (97, 56)
+META_COLUMN = 96
+META_ROWS = 56
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+ZLIB_LEVEL = 6
+
+TYPE_TABLE = tuple(MetaPixel.TYPES.get(r) for r in range(256))
+
+
+class HatError(Exception):
+    pass
+
+
+def probe_png(path):
+    if hasattr(path, 'read'):
+        header = path.read(26)
+        path.seek(0)
+    else:
+        with open(path, 'rb') as file:
+            header = file.read(26)
+    if len(header) < 26 or header[:8] != PNG_SIGNATURE or header[12:16] != b'IHDR':
+        raise HatError("Couldn't open file because it wasn't a PNG file")
+
+    width, height, bit_depth, color_type = struct.unpack('>IIBB', header[16:26])
+    if (width, height) != HAT_SIZE:
+        raise HatError("Couldn't open file because duck game hats need to be "+str(HAT_SIZE)+" pixels in size")
+    return width, height, bit_depth, color_type
+
+
+def load_png(path):
+    from PIL import Image, UnidentifiedImageError
+    probe_png(path)
+    try:
+        return Image.open(path)
+    except UnidentifiedImageError:
+        raise HatError("Wasn't able to identify file as image")
+
+
+def open_hat(path):
+    image = load_png(path)
+    try:
+        return image.convert('RGBA')
+    except ValueError:
+        raise HatError("Couldn't open file because it's color mode is wrong")
+
+
+def open_meta_column(path):
+    with load_png(path) as image:
+        try:
+            return read_meta_column(image)
+        except ValueError:
+            raise HatError("Couldn't open file because it's color mode is wrong")
+
+
+def meta_column(image):
+    return image.crop((META_COLUMN, 0, META_COLUMN+1, META_ROWS))
+
+
+def read_meta_column(image):
+    column = meta_column(image)
+    if column.mode != 'RGBA': column = column.convert('RGBA')
+    return column.tobytes()
+
+
+def meta_rows(data: bytes):
+    keys = set()
+    for r, g, b in zip(data[0::4], data[1::4], data[2::4]):
+        meta_pixel_type = TYPE_TABLE[r]
+        if meta_pixel_type is None or (meta_pixel_type in keys and r < 100): continue
+        keys.add(meta_pixel_type)
+        yield meta_pixel_type, g, b
+
+
+def decode_meta_bytes(data: bytes):
+    return [MetaPixel(meta_pixel_type, g, b) for meta_pixel_type, g, b in meta_rows(data)]
+
+
+def decode_meta_values(data: bytes):
+    values = []
+    for meta_pixel_type, g, b in meta_rows(data):
+        tables = get_tables(meta_pixel_type)
+        values.append((meta_pixel_type,)+tables.encode(g, b)+(tables.decode(g, b),))
+    return values
+
+
+def decode_meta_column(image):
+    return decode_meta_bytes(read_meta_column(image))
+
+
+def encode_meta_bytes(meta_pixels):
+    if META_ROWS < len(meta_pixels):
+        raise HatError("A hat can only hold "+str(META_ROWS)+" MetaPixels but "+str(len(meta_pixels))+" were given")
+    data = bytearray()
+    for meta_pixel in meta_pixels: data.extend(meta_pixel.get_rgba())
+    data.extend(bytes((META_ROWS-len(meta_pixels))*4))
+    return bytes(data)
+
+
+def encode_meta_column(image, meta_pixels):
+    from PIL import Image
+    image.paste(Image.frombytes('RGBA', (1, META_ROWS), encode_meta_bytes(meta_pixels)), (META_COLUMN, 0))
+
+
+def clear_meta_column(image):
+    image.paste((0, 0, 0, 0), (META_COLUMN, 0, META_COLUMN+1, META_ROWS))
+
+
+def read_chunks(data: bytes):
+    chunks = []
+    position = len(PNG_SIGNATURE)
+    while position+8 <= len(data):
+        length, chunk_type = struct.unpack('>I4s', data[position:position+8])
+        chunks.append((chunk_type, data[position+8:position+8+length]))
+        position += 12+length
+        if chunk_type == b'IEND': break
+    return chunks
+
+
+def write_chunks(chunks):
+    output = bytearray(PNG_SIGNATURE)
+    for chunk_type, body in chunks:
+        output += struct.pack('>I', len(body))+chunk_type+body+struct.pack('>I', zlib.crc32(chunk_type+body))
+    return bytes(output)
+
+
+def paeth(a: int, b: int, c: int):
+    p = a+b-c
+    pa, pb, pc = abs(p-a), abs(p-b), abs(p-c)
+    if pa <= pb and pa <= pc: return a
+    return b if pb <= pc else c
+
+
+def predict(filter_type: int, row, prior, i: int):
+    a = row[i-4] if 4 <= i else 0
+    if filter_type == 1: return a
+    if filter_type == 2: return prior[i]
+    if filter_type == 3: return (a+prior[i]) >> 1
+    if filter_type == 4: return paeth(a, prior[i], prior[i-4] if 4 <= i else 0)
+    return 0
+
+
+def unfilter_row(filter_type: int, row: bytearray, prior):
+    if filter_type == 0: return row
+    if filter_type == 2: return bytearray((x+p) & 255 for x, p in zip(row, prior))
+    for i in range(len(row)): row[i] = (row[i]+predict(filter_type, row, prior, i)) & 255
+    return row
+
+
+def patch_meta_png(data: bytes, column: bytes, level=ZLIB_LEVEL):
+    chunks = read_chunks(data)
+    if not chunks or chunks[0][0] != b'IHDR' or len(chunks[0][1]) != 13: return None
+    width, height, bit_depth, color_type = struct.unpack('>IIBB', chunks[0][1][:10])
+    interlace = chunks[0][1][12]
+    if (width, height) != HAT_SIZE or (bit_depth, color_type, interlace) != (8, 6, 0): return None
+
+    try:
+        filtered = bytearray(zlib.decompress(b''.join(body for chunk_type, body in chunks if chunk_type == b'IDAT')))
+    except zlib.error:
+        return None
+    stride = 1+width*4
+    if len(filtered) != stride*height: return None
+
+    start = META_COLUMN*4
+    prior = bytes(width*4)
+    rows = []
+    for y in range(height):
+        filter_type = filtered[y*stride]
+        if 4 < filter_type: return None
+        row = unfilter_row(filter_type, filtered[y*stride+1:(y+1)*stride], prior)
+        rows.append(row)
+        prior = row
+    if all(row[start:start+4] == column[y*4:y*4+4] for y, row in enumerate(rows)): return data
+
+    prior = bytes(width*4)
+    for y, row in enumerate(rows):
+        row[start:start+4] = column[y*4:y*4+4]
+        filter_type = filtered[y*stride]
+        for i in range(start, width*4):
+            filtered[y*stride+1+i] = (row[i]-predict(filter_type, row, prior, i)) & 255
+        prior = row
+
+    output = []
+    for chunk_type, body in chunks:
+        if chunk_type != b'IDAT': output.append((chunk_type, body))
+        elif not output or output[-1][0] != b'IDAT': output.append((b'IDAT', zlib.compress(bytes(filtered), level)))
+    return write_chunks(output)
+
+
+def output_path(path, root, output):
+    relative = os.path.relpath(os.path.abspath(path), root)
+    if relative.startswith(os.pardir): raise HatError("Isn't inside the root "+root)
+    return os.path.join(output, relative)
+
+
+def file_mode(path):
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def write_file(path, data: bytes):
+    mode = file_mode(path)
+    handle, temporary = tempfile.mkstemp(suffix=".png", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(handle, 'wb') as file:
+            file.write(data)
+        os.chmod(temporary, mode)
+        os.replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+
+def save_hat(image, path):
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    write_file(path, output.getvalue())
+
+
+def encode_meta_png(data: bytes, meta_pixels, level=ZLIB_LEVEL):
+    column = encode_meta_bytes(meta_pixels)
+    patched = patch_meta_png(data, column, level)
+    if patched is not None: return patched
+
+    image = open_hat(io.BytesIO(data))
+    if read_meta_column(image) == column: return data
+    encode_meta_column(image, meta_pixels)
+    output = io.BytesIO()
+    image.save(output, format="PNG", compress_level=level)
+    return output.getvalue()
+
+
+def write_meta_column(path, meta_pixels, output=None, level=ZLIB_LEVEL):
+    with open(path, 'rb') as file:
+        data = file.read()
+    probe_png(io.BytesIO(data))
+    patched = encode_meta_png(data, meta_pixels, level)
+    if patched is data and (output is None or output == path): return False
+    write_file(output or path, patched)
+    return patched is not data
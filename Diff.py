@@ -0,0 +1,32 @@
+from Codec import decode_meta_values
+
+
+def keyed_meta_values(meta_values):
+    keyed = {}
+    attached = None
+    for row in meta_values:
+        meta_pixel_type = row[0]
+        if meta_pixel_type.value[0] < 100:
+            attached = meta_pixel_type
+            keyed[meta_pixel_type, None] = [row]
+        else:
+            keyed.setdefault((meta_pixel_type, attached), []).append(row)
+    return keyed
+
+
+def diff_meta_values(before, after):
+    before, after = keyed_meta_values(before), keyed_meta_values(after)
+    changes = []
+    for key in list(before)+[key for key in after if key not in before]:
+        old, new = before.get(key, ()), after.get(key, ())
+        for i in range(max(len(old), len(new))):
+            old_row = old[i] if i < len(old) else None
+            new_row = new[i] if i < len(new) else None
+            if old_row is not None and new_row is not None and old_row[1:3] == new_row[1:3]: continue
+            changes.append((key[0], key[1], old_row, new_row))
+    return changes
+
+
+def diff_columns(before: bytes, after: bytes):
+    if before == after: return []
+    return diff_meta_values(decode_meta_values(before), decode_meta_values(after))
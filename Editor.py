@@ -1,544 +1,151 @@
-from PIL import Image
-import PIL
+import io
+import os
 import tkinter as tk
-from tkinter.filedialog import askopenfile, asksaveasfile
+from tkinter.filedialog import askopenfile, asksaveasfilename
 from tkinter.messagebox import showinfo, askyesno, askokcancel
-import enum
-
-
-class ValueType(enum.Enum):
-    Bool = 0
-    Int = 1
-    Float = 2
-    IntPair = 3
-    Vec2 = 4
-    NormVec2 = 5
-    Randomize = 6
-
-    def create_meta_pixel_value(self, kwargs):
-        if self.value == 0: return Bool()
-        elif self.value == 1: return Int(**kwargs)
-        elif self.value == 2: return Float(**kwargs)
-        elif self.value == 3: return IntPair(**kwargs)
-        elif self.value == 4: return Vec2(**kwargs)
-        elif self.value == 5: return NormalizedVec2(**kwargs)
-        elif self.value == 6: return Randomize()
-        return None
-
-
-class TypeHolder:
-    COLORS = {
-        0: "Snow2",
-        1: "cyan",
-        2: "Lime",
-        3: "DeepSkyBlue",
-        4: "Tan1",
-        5: "Maroon1",
-        6: "SlateBlue"
-    }
-
-    def __init__(self, meta_pixel_value_type: ValueType, **kwargs):
-        self.type = meta_pixel_value_type
-        self.kwargs = kwargs
-
-    def generate(self):
-        return self.type.create_meta_pixel_value(self.kwargs)
-
-
-class MetaPixelValue:
-    def __init__(self, value):
-        assert isinstance(value, ValueType)
-        self.type = value
-        self.g = 0
-        self.b = 0
-
-    def get_type(self):
-        return self.type
-
-    def get_values(self):
-        return ()
-
-    def get_colors(self):
-        self.calc_colors()
-        return self.g, self.b
-
-    def calc_colors(self):
-        self.g = 0
-        self.b = 0
-
-    def set_colors(self, g: int, b: int):
-        pass
-
-    def get_help(self):
-        return self.type.name
-
-    def set_value(self, a: float, b: float):
-        pass
-
-
-class Bool(MetaPixelValue):
-    def __init__(self):
-        super().__init__(ValueType.Bool)
-
-    def get_values(self):
-        return ()
-
-    def get_help(self):
-        return "If this meta pixel exists it's properties are on"
-
-
-class Vec2(MetaPixelValue):
-    def __init__(self, vec_range=128.0, value=(128.0, 128.0)):
-        super().__init__(ValueType.Vec2)
-        self.midpoint = value
-        self.range = vec_range
-        self.value_x = self.midpoint[0]
-        self.value_y = self.midpoint[1]
-
-    def get_values(self):
-        self.set_colors(self.g, self.b)
-        self.calc_colors()
-        return self.value_x, self.value_y
-
-    def calc_colors(self):
-        self.g = self.value_x+self.midpoint[0]
-        self.b = self.value_y+self.midpoint[1]
-
-    def set_colors(self, g: int, b: int):
-        self.g = g
-        self.b = b
-        self.value_x = self.g-self.midpoint[0]
-        self.value_y = self.b-self.midpoint[1]
-        if self.range < self.value_x: self.value_x = self.range
-        if self.range < self.value_y: self.value_y = self.range
-        if self.value_x < -self.range: self.value_x = -self.range
-        if self.value_y < -self.range: self.value_y = -self.range
-
-    def set_value(self, a: float, b: float):
-        self.value_x = a
-        self.value_y = b
-        self.calc_colors()
-
-    def get_help(self):
-        return str(self.midpoint[0])+" is 0, negative numbers are below that value & positive above. This Vec2 has a " \
-                                     "range of " \
-               + str(self.range)+" which means the min & max are ("+str(self.midpoint[0]-self.range)+", "\
-               + str(self.midpoint[1]+self.range)+")"
-
-
-class Float(MetaPixelValue):
-    def __init__(self, float_range=1.0, value=1.0):
-        super().__init__(ValueType.Float)
-        self.range = float_range
-        self.value = value
-
-    def get_values(self):
-        self.set_colors(self.g, self.b)
-        self.calc_colors()
-        return self.value,
-
-    def calc_colors(self):
-        self.g = int(255 * (self.value / self.range))
-        self.b = 0
-
-    def set_colors(self, g: int, b: int):
-        self.g = g
-        self.b = 0
-        self.value = (self.g / 255) * self.range
-
-    def set_value(self, a: float, b: float):
-        self.value = a
-        self.calc_colors()
-
-    def get_help(self):
-        return "0 through 255 will be translated into a number between two values. For this float those two values are"\
-               + " 0.0 to "+str(self.range)+"."
-
-
-class Int(MetaPixelValue):
-    def __init__(self, int_range=255, value=0):
-        super().__init__(ValueType.Int)
-        self.range = int_range
-        self.value = value
-
-    def get_values(self):
-        self.set_colors(self.g, self.b)
-        self.calc_colors()
-        return self.value,
-
-    def calc_colors(self):
-        self.g = self.value
-        self.b = 0
-
-    def set_colors(self, g: int, b: int):
-        self.g = g
-        self.b = 0
-        self.value = g
-        if self.range < self.value: self.value = self.range
-        if self.value < 0: self.value = 0
-
-    def set_value(self, a: float, b: float):
-        self.value = a
-        self.calc_colors()
-
-    def get_help(self):
-        return "The green RGB value is the value of the integer. This integer has a max value of "+str(self.range)
-
-
-class IntPair(MetaPixelValue):
-    def __init__(self, int_range_x=255, int_range_y=255, value_x=0, value_y=0):
-        super().__init__(ValueType.IntPair)
-        self.value_x = Int(int_range=int_range_x, value=value_x)
-        self.value_y = Int(int_range=int_range_y, value=value_y)
-
-    def get_values(self):
-        self.set_colors(self.g, self.b)
-        self.calc_colors()
-        return self.value_x.get_values()[0], self.value_y.get_values()[0]
-
-    def calc_colors(self):
-        self.g = self.value_x.get_colors()[0]
-        self.b = self.value_y.get_colors()[0]
-
-    def set_colors(self, g: int, b: int):
-        self.g = g
-        self.b = b
-        self.value_x.set_colors(g, 0)
-        self.value_y.set_colors(b, 0)
-
-    def set_value(self, a: float, b: float):
-        self.value_x.set_value(a, 0.0), self.value_y.set_value(b, 0.0)
-        self.calc_colors()
-
-    def get_help(self):
-        return "The green RGB value is the first value of the integer, the second is the blue RGB value. This IntPair "\
-               + "has a max value A & max value B of "+str((self.value_x.range, self.value_y.range))
-
-
-class NormalizedVec2(MetaPixelValue):
-    def __init__(self, vec_range=1.0, value=(0.0, 0.0), allow_negative=True):
-        super().__init__(ValueType.NormVec2)
-        self.offset = (128.0, 128.0) if allow_negative else (0.0, 0.0)
-        self.negative = allow_negative
-        self.range = vec_range
-        self.value_x = value[0]
-        self.value_y = value[1]
-
-    def get_values(self):
-        self.set_colors(self.g, self.b)
-        self.calc_colors()
-        return self.value_x, self.value_y
-
-    def calc_colors(self):
-        self.g = (255 * (self.value_x / self.range))+self.offset[0]
-        self.b = (255 * (self.value_y / self.range))+self.offset[1]
-
-    def set_colors(self, g: int, b: int):
-        self.g = g
-        self.b = b
-        self.value_x = (self.g - self.offset[0]) / 255 * self.range
-        self.value_y = (self.b - self.offset[1]) / 255 * self.range
-        if self.negative:
-            if self.value_x < -self.range/2: self.value_x = -self.range/2
-            elif self.range/2 < self.value_x: self.value_x = self.range/2
-
-            if self.value_y < -self.range/2: self.value_y = -self.range/2
-            elif self.range/2 < self.value_y: self.value_y = self.range/2
-        else:
-            if self.value_x < 0: self.value_x = 0
-            elif self.range < self.value_x: self.value_x = self.range
-
-            if self.value_y < -self.range / 2: self.value_y = -self.range / 2
-            elif self.range < self.value_y: self.value_y = self.range / 2
-
-    def set_value(self, a: float, b: float):
-        self.value_x = a
-        self.value_y = b
-        self.calc_colors()
-
-    def get_help(self):
-        range_min = -self.range/2 if self.negative else 0.0
-        range_max = self.range/2 if self.negative else self.range
-
-        return "A vector that behaves like a float where the green & blue RGB values (0 through 255) are turned into" \
-               " a different number range. For this NormalizedVec2 that is ("+str(range_min)+", "+str(range_max)+")"
-
-
-class Randomize(MetaPixelValue):
-    def __init__(self):
-        super().__init__(ValueType.Randomize)
-
-    def get_values(self):
-        return ()
-
-    def calc_colors(self):
-        pass
-
-    def set_colors(self, g: int, b: int):
-        self.g = g
-        self.b = b
-
-
-class MetaPixelType(enum.Enum):
-    # Misc
-    HatOffset = 1, TypeHolder(ValueType.Vec2, vec_range=16), \
-    "Hat offset position in pixels", 0
-
-    UseDuckColor = 2, TypeHolder(ValueType.Bool), \
-    "If this metapixel exists, White (255, 255, 255) and Grey(157, 157, 157) will be recolored to duck colors.", 0
-
-    # Capes
-    CapeOffset = 10, TypeHolder(ValueType.Vec2, vec_range=16), \
-    "Cape offset position in pixels", 1
-
-    CapeForeground = 11, TypeHolder(ValueType.Bool), \
-    "If this metapixel exists, the cape will be drawn over the duck.", 1
-
-    CapeSwayModifier = 12, TypeHolder(ValueType.NormVec2, value=(0.3, 1.0)), \
-    "Affects cape length, and left to right sway.", 1
-
-    CapeWiggleModifier = 13, TypeHolder(ValueType.NormVec2, value=(1.0, 1.0)), \
-    "Affects how much the cape wiggles in the wind.", 1
-
-    CapeTaperStart = 14, TypeHolder(ValueType.Float, value=0.5), \
-    "Affects how narrow the cape/trail is at the top/beginning.", 1
-
-    CapeTaperEnd = 15, TypeHolder(ValueType.Float), \
-    "Affects how narrow the cape/trail is at the bottom/end.", 1
-
-    CapeAlphaStart = 16, TypeHolder(ValueType.Float), \
-    "Affects how transparent the cape/trail is at the top/beginning.", 1
-
-    CapeAlphaEnd = 17, TypeHolder(ValueType.Float), \
-    "Affects how transparent the cape/trail is at the bottom/end.", 1
-
-    CapeIsTrail = 20, TypeHolder(ValueType.Bool), \
-    "If this metapixel exists, the cape will be a trail instead of a cape (think of the rainbow trail left by the " \
-    "TV object).", 1
-
-    # Particles
-    ParticleEmitterOffset = 30, TypeHolder(ValueType.Vec2, vec_range=16.0), \
-    "The offset in pixels from the center of the hat where particles will be emitted.", 2
-
-    ParticleDefaultBehavior = 31, TypeHolder(ValueType.Int, int_range=4, value=0), \
-    "B defines a particle behavior from a list of presets: 0 = No Behavior, 1 = Spit, 2 = Burst," \
-    " 3 = Halo, 4 = Exclamation", 2
-
-    ParticleEmitShape = 32, TypeHolder(ValueType.IntPair, int_range_x=2, int_range_y=2), \
-    "G: 0 = Point, 1 = Circle, 2 = Box   B: 0 = Emit Around Shape Border Randomly, 1 = Fill Shape Randomly, " \
-    "2 = Emit Around Shape Border Uniformly", 2
-
-    ParticleEmitShapeSize = 33, TypeHolder(ValueType.Vec2, vec_range=24.0, value=(24.0, 24.0)), \
-    "X and Y size of the particle emitter (in pixels). Should be IntPair with usage but is this type in docs.", 2
-
-    ParticleCount = 34, TypeHolder(ValueType.Int, int_range=8, value=4), \
-    "The number of particles to emit.", 2
-
-    ParticleLifespan = 35, TypeHolder(ValueType.Float, float_range=2.0), \
-    "Life span of the particle, in seconds (0 to 2 seconds)", 2
-
-    ParticleVelocity = 36, TypeHolder(ValueType.NormVec2, vec_range=2.0), \
-    "Initial velocity of the particle.", 2
-
-    ParticleGravity = 37, TypeHolder(ValueType.NormVec2, vec_range=2.0), \
-    "Gravity applied to the particle.", 2
-
-    ParticleFriction = 38, TypeHolder(ValueType.NormVec2, vec_range=2.0, allow_negative=False, value=(1.0, 1.0)), \
-    "Friction applied to the particle (The value it's velocity is multiplied by every frame).", 2
-
-    ParticleAlpha = 39, TypeHolder(ValueType.NormVec2, vec_range=2.0, allow_negative=False, value=(1.0, 1.0)), \
-    "G = Start alpha, B = End alpha", 2
-
-    ParticleScale = 40, TypeHolder(ValueType.NormVec2, vec_range=2.0, allow_negative=False, value=(1.0, 0.0)), \
-    "G = Start scale, B = End scale", 2
-
-    ParticleRotation = 41, TypeHolder(ValueType.NormVec2, vec_range=36.0, allow_negative=False, value=(0.0, 0.0)),\
-    "G = Start rotation, B = End rotation", 2
-
-    ParticleOffset = 42, TypeHolder(ValueType.Vec2, vec_range=16), \
-    "Additional X Y offset of particle.", 2
-
-    ParticleBackground = 43, TypeHolder(ValueType.Bool), \
-    "If this metapixel exists, particles will be rendered behind the duck.", 2
-
-    ParticleAnchor = 44, TypeHolder(ValueType.Bool), \
-    "If this metapixel exists, particles will stay anchored around the hat position when it's moving.", 2
-
-    ParticleAnimated = 45, TypeHolder(ValueType.Bool), \
-    "If this metapixel exists, particles will animate through their frames. Otherwise, a frame will be picked " \
-    "randomly.", 2
-
-    ParticleAnimationLoop = 46, TypeHolder(ValueType.Bool), \
-    "If this metapixel exists, the particle animation will loop.", 2
-
-    ParticleAnimationRandomFrame = 47, TypeHolder(ValueType.Bool), \
-    "If this metapixel exists, the particle animation will start on a random frame.", 2
-
-    ParticleAnimationSpeed = 48, TypeHolder(ValueType.Float, value=0.1), \
-    "How quickly the particle animates.", 2
-
-    # Strange
-    WetLips = 70, TypeHolder(ValueType.Bool), \
-    "If this metapixel exists, the hat will have 'wet lips'.", 3
-
-    MechanicalLips = 71, TypeHolder(ValueType.Bool), \
-    "If this metapixel exists, the hat will have 'mechanical lips'.", 3
-
-    # Special
-    RandomizeParameterX = 100, TypeHolder(ValueType.Randomize), \
-    "If present, the previously defined metapixel value will have a random number between G and B applied to its A " \
-    "value each time it's used. This will generally only work with particles..", 4
-
-    RandomizeParameterY = 101, TypeHolder(ValueType.Randomize), \
-    "If present, the previously defined metapixel value will have a random number between G and B applied to its B " \
-    "value each time it's used. This will generally only work with particles..", 4
-
-    RandomizeParameter = 102, TypeHolder(ValueType.Randomize), \
-    "If present, the previously defined metapixel value will have a random number between G and B applied to its " \
-    "A and B values each time it's used. This will generally only work with particles..", 4
-
-
-class MetaPixel:
-
-    TYPES = {
-            1: MetaPixelType.HatOffset,
-            2: MetaPixelType.UseDuckColor,
-            10: MetaPixelType.CapeOffset,
-            11: MetaPixelType.CapeForeground,
-            12: MetaPixelType.CapeSwayModifier,
-            13: MetaPixelType.CapeWiggleModifier,
-            14: MetaPixelType.CapeTaperStart,
-            15: MetaPixelType.CapeTaperEnd,
-            16: MetaPixelType.CapeAlphaStart,
-            17: MetaPixelType.CapeAlphaEnd,
-            20: MetaPixelType.CapeIsTrail,
-            30: MetaPixelType.ParticleEmitterOffset,
-            31: MetaPixelType.ParticleDefaultBehavior,
-            32: MetaPixelType.ParticleEmitShape,
-            33: MetaPixelType.ParticleEmitShapeSize,
-            34: MetaPixelType.ParticleCount,
-            35: MetaPixelType.ParticleLifespan,
-            36: MetaPixelType.ParticleVelocity,
-            37: MetaPixelType.ParticleGravity,
-            38: MetaPixelType.ParticleFriction,
-            39: MetaPixelType.ParticleAlpha,
-            40: MetaPixelType.ParticleScale,
-            41: MetaPixelType.ParticleRotation,
-            42: MetaPixelType.ParticleOffset,
-            43: MetaPixelType.ParticleBackground,
-            44: MetaPixelType.ParticleAnchor,
-            45: MetaPixelType.ParticleAnimated,
-            46: MetaPixelType.ParticleAnimationLoop,
-            47: MetaPixelType.ParticleAnimationRandomFrame,
-            48: MetaPixelType.ParticleAnimationSpeed,
-            70: MetaPixelType.WetLips,
-            71: MetaPixelType.MechanicalLips,
-            100: MetaPixelType.RandomizeParameterX,
-            101: MetaPixelType.RandomizeParameterY,
-            102: MetaPixelType.RandomizeParameter
-        }
-
-    COLORS = {
-        0: "Gold",
-        1: "LightSkyBlue",
-        2: "PaleGreen",
-        3: "Wheat1",
-        4: "HotPink"
-    }
-
-    def __init__(self, meta_pixel_type: MetaPixelType, g, b):
-        assert isinstance(meta_pixel_type, MetaPixelType)
-        self.type = meta_pixel_type
-
-        value = meta_pixel_type.value[1]
-        assert isinstance(value, TypeHolder)
-        self.value = value.generate()
-
-        self.value.set_colors(g, b)
-
-    def get_rgba(self):
-        gb = self.value.get_colors()
-        r, g, b, a = int(self.type.value[0]), int(gb[0]), int(gb[1]), 255
-        g = 0 if g < 0 else 255 if 255 < g else g
-        b = 0 if b < 0 else 255 if 255 < b else b
-        return r, g, b, a
-
-    def get_value(self):
-        return self.value.get_values()
+from tkinter.simpledialog import askinteger
+from MetaPixels import TypeHolder, MetaPixelType, MetaPixel
+from Codec import HatError, open_hat, decode_meta_column, encode_meta_bytes, encode_meta_png, write_file
+from History import History, ADD, MOVE, SWAP, CHANGE
+from Journal import Journal, find_journals, read_journal, replay_journal, lock_journal, unlock_journal
+import Capes
+
+
+ICON = """iVBORw0KGgoAAAANSUhEUgAAAGAAAABgCAYAAADimHc4AAABhWlDQ1
+BJQ0MgcHJvZmlsZQAAKJF9kT1Iw0AcxV9bpUVbHCwoIpihOlkQFXGUKhbBQmkrtOpgcukXNGlIUl
+wcBdeCgx+LVQcXZ10dXAVB8APEydFJ0UVK/F9SaBHjwXE/3t173L0DvI0KU4yuCUBRTT0VjwnZ3K
+rgf0UvBhBACCMiM7REejED1/F1Dw9f76I8y/3cnyMk5w0GeATiOabpJvEG8cymqXHeJw6zkigTnx
+OP63RB4keuSw6/cS7a7OWZYT2TmicOEwvFDpY6mJV0hXiaOCIrKuV7sw7LnLc4K5Uaa92TvzCYV1
+fSXKc5jDiWkEASAiTUUEYFJqK0qqQYSNF+zMU/ZPuT5JLIVQYjxwKqUCDafvA/+N2tUZiadJKCMa
+D7xbI+RgH/LtCsW9b3sWU1TwDfM3Cltv3VBjD7SXq9rUWOgL5t4OK6rUl7wOUOMPikibpoSz6a3k
+IBeD+jb8oB/bdAz5rTW2sfpw9AhrpavgEODoGxImWvu7w70Nnbv2da/f0AYUpyoBrfN9UAAAAGYk
+tHRABYAFgAWPY/mbsAAAAJcEhZcwAACxMAAAsTAQCanBgAAAAHdElNRQfkCxcIFCWQpv+pAAAAGX
+RFWHRDb21tZW50AENyZWF0ZWQgd2l0aCBHSU1QV4EOFwAAAdFJREFUeNrt3a1OA0EUhuFdUo9BIi
+AkGILAQ4LFI1YgoIQbQIAA2YpeRAmyDtkQDAnFYggGBAgMQTS9AriBOWKShaXleeXJdNuZN2fzZf
+anZVVVBZpjzhIQQAAIIAAEEAACCAABBOD3aOV+YDAYfKXqVVWVllMHEAACCAAB05+CorSzf3qeHH
+/Z60hHOoAAEEAACJiBFBSxtbqcTkGZaQo6gAAQQAABaJQy9+7oulLNZ2+jlgksnDykJ1amt6D6/f
+6PLmi73c76PTrAKYgAEEAAGqJV14F2NteS9eHoKVm/fpnU88VHK7Uc5u75NVmP9r6i8cXFhQ5wCg
+IBBICAqU5B0Z7P7dJ6cvz26DFZj/Ze9g4PG5lwmF4aGq8DnIIIAAEE4K+loFzCdBSknWjvaPfguJ
+bUcdnrJOsf91c6AAQQAAIIQI0p6GY8TtbP5heT9W5wpWw4qmePKHo27a/dra0DCCAABBCAhiiLos
+i68hWlnYju5D0rpUTM6nuKdAABBIAAAjAtKSgiSkdRCsplVt87pAMIIAAEEICGyL4ilpt2vDVRBx
+AAAggAAdOVgrbfHq2ODiAABBAAAmaX0n/K6wACQAABIIAAEEAACCAABPwbvgGpc2uukqDTSwAAAA
+BJRU5ErkJggg=="""
 
 
 class MetaPixelGui:
+    EDIT_DELAY = 150
+
     def __init__(self, pixel: MetaPixel, row: int, frame: tk.Frame, label: tk.Label, editor):
         assert isinstance(editor, Editor)
         self.editor = editor
         self.label = label
+        self.frame = frame
+        self.row = row
+        self.pending = None
 
-        self.pixel = pixel
+        self.pixel = None
+        self.valueA = None
+        self.valueB = None
 
         self.remove_button = tk.Button(frame, text="X", bg="red")
         self.remove_button["command"] = self.click_x
-        self.remove_button.grid(column=0, row=row, sticky=tk.NSEW)
 
-        self.meta_pixel_button = tk.Button(frame, text=pixel.type.name, bg=self.pixel.COLORS.get(pixel.type.value[3]))
+        self.meta_pixel_button = tk.Button(frame)
         self.meta_pixel_button["command"] = self.click_meta
-        self.meta_pixel_button.grid(column=1, row=row, sticky=tk.NSEW)
+        self.meta_pixel_button.bind('<B1-Motion>', self.drag)
+        self.meta_pixel_button.bind('<ButtonRelease-1>', self.drop)
+        self.meta_pixel_button.bind('<Button-3>', self.click_move)
 
         self.G = tk.Text(frame, width=3, height=1)
-        self.G.grid(column=2, row=row, sticky=tk.NSEW)
-        self.G.insert(tk.INSERT, str(self.pixel.value.g))
-
+        self.G.bind('<<Modified>>', self.color_modified)
         self.B = tk.Text(frame, width=3, height=1)
-        self.B.grid(column=3, row=row, sticky=tk.NSEW)
-        self.B.insert(tk.INSERT, str(self.pixel.value.b))
+        self.B.bind('<<Modified>>', self.color_modified)
 
-        self.G.edit_modified(False)
-        self.B.edit_modified(False)
-
-        self.ValueType = tk.Button(frame, text=pixel.type.value[1].type.name,
-                                   bg=TypeHolder.COLORS.get(pixel.type.value[1].type.value))
+        self.ValueType = tk.Button(frame)
         self.ValueType["command"] = self.click_type
-        self.ValueType.grid(column=4, row=row, sticky=tk.NSEW)
-
-        values = self.pixel.value.get_values()
-        self.valueA = None
-        self.valueB = None
-
-        if 0 < len(values):
-            self.valueA = tk.Text(frame, width=6, height=1)
-            self.valueA.grid(column=5, row=row, sticky=tk.NSEW)
-            self.valueA.insert(tk.INSERT, str(self.pixel.value.get_values()[0]))
-            self.valueA.edit_modified(False)
-
-        if 1 < len(values):
-            self.valueB = tk.Text(frame, width=6, height=1)
-            self.valueB.grid(column=6, row=row, sticky=tk.NSEW)
-            self.valueB.insert(tk.INSERT, str(self.pixel.value.get_values()[1]))
-            self.valueB.edit_modified(False)
 
         self.up_button = tk.Button(frame, text="∧", bg="LightBlue")
         self.up_button["command"] = self.click_up
-        self.up_button.grid(column=7, row=row, sticky=tk.NSEW)
 
         self.down_button = tk.Button(frame, text="∨", bg="LightBlue")
         self.down_button["command"] = self.click_down
-        self.down_button.grid(column=8, row=row, sticky=tk.NSEW)
 
-        self.on_value_change()
+        self.set_pixel(pixel)
+        self.set_row(row)
+
+    def set_pixel(self, pixel: MetaPixel):
+        self.flush_change()
+        self.pixel = pixel
+        self.meta_pixel_button.configure(text=pixel.type.name, bg=MetaPixel.COLORS.get(pixel.type.value[3]))
+        self.ValueType.configure(text=pixel.type.value[1].type.name,
+                                 bg=TypeHolder.COLORS.get(pixel.type.value[1].type.value))
+
+        self.set_text(self.G, int(self.pixel.g))
+        self.set_text(self.B, int(self.pixel.b))
+
+        values = self.pixel.get_value()
+        self.valueA = self.set_value_text(self.valueA, 5, values[0] if 0 < len(values) else None)
+        self.valueB = self.set_value_text(self.valueB, 6, values[1] if 1 < len(values) else None)
+
         self.on_color_change()
 
-    def key_event(self):
-        if self.G.edit_modified() or self.B.edit_modified():
-            self.on_color_change()
-            self.G.edit_modified(False)
-            self.B.edit_modified(False)
-        if self.valueA is not None:
-            if self.valueA.edit_modified():
-                self.on_value_change()
-                self.valueA.edit_modified(False)
-        if self.valueB is not None:
-            if self.valueB.edit_modified():
-                self.on_value_change()
-                self.valueB.edit_modified(False)
+    def set_value_text(self, text: tk.Text, column: int, value):
+        if value is None:
+            if text is not None: text.destroy()
+            return None
+        if text is None:
+            text = tk.Text(self.frame, width=6, height=1)
+            text.bind('<<Modified>>', self.value_modified)
+            text.grid(column=column, row=self.row, sticky=tk.NSEW)
+        self.set_text(text, value)
+        return text
+
+    @staticmethod
+    def set_text(text: tk.Text, value):
+        if text.get('1.0', 'end-1c') == str(value): return
+        text.delete('1.0', tk.END)
+        text.insert(tk.INSERT, str(value))
+        text.edit_modified(False)
+
+    def set_row(self, row: int):
+        self.row = row
+        self.remove_button.grid(column=0, row=row, sticky=tk.NSEW)
+        self.meta_pixel_button.grid(column=1, row=row, sticky=tk.NSEW)
+        self.G.grid(column=2, row=row, sticky=tk.NSEW)
+        self.B.grid(column=3, row=row, sticky=tk.NSEW)
+        self.ValueType.grid(column=4, row=row, sticky=tk.NSEW)
+        if self.valueA is not None: self.valueA.grid(column=5, row=row, sticky=tk.NSEW)
+        if self.valueB is not None: self.valueB.grid(column=6, row=row, sticky=tk.NSEW)
+        self.up_button.grid(column=7, row=row, sticky=tk.NSEW)
+        self.down_button.grid(column=8, row=row, sticky=tk.NSEW)
+
+    def color_modified(self, event):
+        if not event.widget.edit_modified(): return
+        event.widget.edit_modified(False)
+        self.schedule_change(self.on_color_change, 2 if event.widget is self.G else 3)
+
+    def value_modified(self, event):
+        if not event.widget.edit_modified(): return
+        event.widget.edit_modified(False)
+        self.schedule_change(self.on_value_change, 5 if event.widget is self.valueA else 6)
+
+    def schedule_change(self, change, column: int):
+        self.cancel_change()
+        self.pending = self.frame.after(self.EDIT_DELAY, self.flush_change), change, column
+
+    def cancel_change(self):
+        if self.pending is None: return
+        self.frame.after_cancel(self.pending[0])
+        self.pending = None
+
+    def flush_change(self):
+        if self.pending is None: return
+        change, column = self.pending[1:]
+        self.cancel_change()
+        old = self.pixel.get_rgba()
+        change()
+        index = self.editor.meta_pixel_index.get(self.pixel)
+        if index is not None: self.editor.history.change(index, old, self.pixel.get_rgba(), column)
 
     def on_value_change(self):
         value_a = 0.0
@@ -549,14 +156,9 @@ class MetaPixelGui:
         except ValueError:
             pass
 
-        self.pixel.value.set_value(value_a, value_b)
-        self.G.delete('1.0', tk.END)
-        self.G.insert(tk.INSERT, int(self.pixel.value.g))
-        self.G.edit_modified(False)
-
-        self.B.delete('1.0', tk.END)
-        self.B.insert(tk.INSERT, int(self.pixel.value.b))
-        self.B.edit_modified(False)
+        self.pixel.set_value(value_a, value_b)
+        self.set_text(self.G, int(self.pixel.g))
+        self.set_text(self.B, int(self.pixel.b))
 
     def on_color_change(self):
         g = 0
@@ -568,19 +170,15 @@ class MetaPixelGui:
             pass
         g = 0 if g < 0 else 255 if 255 < g else g
         b = 0 if b < 0 else 255 if 255 < b else b
-        self.pixel.value.set_colors(g, b)
-        values = self.pixel.value.get_values()
+        self.pixel.set_colors(g, b)
+        values = self.pixel.get_value()
         if 0 < len(values):
             value = float("{:.3f}".format(values[0]))
-            self.valueA.delete('1.0', tk.END)
-            self.valueA.insert(tk.INSERT, int(values[0]) if int(values[0]) == value else value)
-            self.valueA.edit_modified(False)
+            self.set_text(self.valueA, int(values[0]) if int(values[0]) == value else value)
 
         if 1 < len(values):
             value = float("{:.3f}".format(values[1]))
-            self.valueB.delete('1.0', tk.END)
-            self.valueB.insert(tk.INSERT, int(values[1]) if int(values[1]) == value else value)
-            self.valueB.edit_modified(False)
+            self.set_text(self.valueB, int(values[1]) if int(values[1]) == value else value)
 
     def click_meta(self):
         self.label["text"] = self.pixel.type.value[2]
@@ -597,7 +195,24 @@ class MetaPixelGui:
     def click_down(self):
         self.editor.move_meta_pixel_down(self.pixel)
 
+    def click_move(self, _):
+        count = len(self.editor.meta_pixels)
+        position = askinteger(title="Move "+self.pixel.type.name, prompt="Move to position (1 - "+str(count)+")",
+                              initialvalue=self.editor.meta_pixel_index.get(self.pixel, 0)+1, minvalue=1,
+                              maxvalue=count, parent=self.frame)
+        if position is not None: self.editor.move_meta_pixel(self.pixel, position-1)
+
+    def drag(self, _):
+        self.meta_pixel_button["cursor"] = "sb_v_double_arrow"
+
+    def drop(self, event):
+        if self.meta_pixel_button["cursor"] == "": return
+        self.meta_pixel_button["cursor"] = ""
+        row = self.frame.grid_location(event.x_root-self.frame.winfo_rootx(), event.y_root-self.frame.winfo_rooty())[1]
+        self.editor.move_meta_pixel(self.pixel, self.editor.top+row-1)
+
     def remove(self):
+        self.cancel_change()
         self.meta_pixel_button.destroy()
         self.G.destroy()
         self.B.destroy()
@@ -609,34 +224,206 @@ class MetaPixelGui:
         self.down_button.destroy()
 
 
+class MetaPixelChooser:
+    def __init__(self, editor):
+        assert isinstance(editor, Editor)
+        self.editor = editor
+        self.category = None
+        self.shown = []
+
+        self.root = tk.Toplevel(editor.root)
+        self.root.withdraw()
+        self.root.title("Add MetaPixel")
+        self.root.resizable(width=False, height=False)
+        self.root.protocol("WM_DELETE_WINDOW", self.hide)
+        self.root.bind('<Escape>', lambda _: self.hide())
+
+        self.search = tk.StringVar(self.root)
+        self.search.trace_add("write", lambda *_: self.refresh())
+        self.entry = tk.Entry(self.root, textvariable=self.search)
+        self.entry.bind('<Return>', self.click_first)
+        self.entry.pack(fill="x")
+
+        categories = tk.Frame(self.root)
+        categories.pack(fill="x")
+        self.category_buttons = {}
+        for column, category in enumerate((None,)+tuple(MetaPixel.CATEGORIES)):
+            button = tk.Button(categories, text=MetaPixel.CATEGORIES.get(category, "All"), pady=0, borderwidth=1,
+                               bg=MetaPixel.COLORS.get(category, "gray"))
+            button["command"] = lambda category=category: self.set_category(category)
+            button.grid(column=column, row=0, sticky=tk.NSEW)
+            self.category_buttons[category] = button
+
+        self.options = tk.Frame(self.root)
+        self.options.pack(fill="x")
+        self.buttons = {}
+        for meta_pixel_type in MetaPixel.TYPES.values():
+            button = tk.Button(self.options, text=meta_pixel_type.name, justify=tk.LEFT, pady=0, borderwidth=1,
+                               bg=MetaPixel.COLORS.get(meta_pixel_type.value[3]))
+            button["command"] = lambda meta_pixel_type=meta_pixel_type: self.choose(meta_pixel_type)
+            self.buttons[meta_pixel_type] = button
+
+        self.set_category(None)
+
+    def refresh(self):
+        search = self.search.get().strip().lower()
+        present = set(self.editor.meta_pixel_keys)
+        shown = [meta_pixel_type for meta_pixel_type in self.buttons
+                 if (100 <= meta_pixel_type.value[0] or meta_pixel_type not in present)
+                 and (self.category is None or meta_pixel_type.value[3] == self.category)
+                 and search in meta_pixel_type.name.lower()]
+        if shown == self.shown: return
+        for meta_pixel_type in self.shown: self.buttons[meta_pixel_type].pack_forget()
+        for meta_pixel_type in shown: self.buttons[meta_pixel_type].pack(fill="x")
+        self.shown = shown
+
+    def set_category(self, category):
+        self.category_buttons[self.category]["relief"] = tk.RAISED
+        self.category_buttons[category]["relief"] = tk.SUNKEN
+        self.category = category
+        self.refresh()
+
+    def show(self):
+        self.refresh()
+        self.root.deiconify()
+        self.root.lift()
+        self.entry.focus_set()
+
+    def hide(self):
+        self.root.withdraw()
+
+    def click_first(self, _):
+        if self.shown: self.choose(self.shown[0])
+
+    def choose(self, meta_pixel_type: MetaPixelType):
+        meta_pixel = MetaPixel(meta_pixel_type, 0, 0)
+        self.editor.flush_changes()
+        self.editor.meta_pixel_keys.append(meta_pixel_type)
+        self.editor.meta_pixels.append(meta_pixel)
+        self.editor.add_meta_pixel(meta_pixel)
+        self.search.set("")
+        self.hide()
+
+
+class Preview:
+    SCALE = 4
+    FPS = 60
+    BACKGROUND = (48, 48, 48)
+
+    def __init__(self, editor, title: str, size):
+        assert isinstance(editor, Editor)
+        self.editor = editor
+        self.pending = None
+
+        self.root = tk.Toplevel(editor.root)
+        self.root.title(title)
+        self.root.resizable(width=False, height=False)
+        self.root.protocol("WM_DELETE_WINDOW", self.hide)
+
+        self.width, self.height = size[0]*self.SCALE, size[1]*self.SCALE
+        self.canvas = tk.Canvas(self.root, width=self.width, height=self.height, highlightthickness=0,
+                                bg="#%02x%02x%02x" % self.BACKGROUND)
+        self.canvas.pack()
+
+    def show(self):
+        self.root.deiconify()
+        self.root.lift()
+        if self.pending is None: self.tick()
+
+    def hide(self):
+        self.root.withdraw()
+        if self.pending is not None: self.root.after_cancel(self.pending)
+        self.pending = None
+
+    def color(self, alpha: float, color):
+        return "#%02x%02x%02x" % tuple(int(background+(value-background)*alpha)
+                                       for background, value in zip(self.BACKGROUND, color))
+
+    def tick(self):
+        self.pending = self.root.after(1000//self.FPS, self.tick)
+        self.update()
+
+    def update(self):
+        pass
+
+
+class ParticlePreview(Preview):
+    def __init__(self, editor):
+        import Particles
+        self.particles = Particles
+        Preview.__init__(self, editor, "Particle Preview", Particles.FRAME_SIZE)
+        self.system = None
+        self.signature = None
+
+        hat = Particles.HAT_FRAME[2]*self.SCALE//2
+        self.canvas.create_rectangle(self.width//2-hat, self.height//2-hat, self.width//2+hat, self.height//2+hat,
+                                     outline="gray50", dash=(4, 4))
+        self.items = [self.canvas.create_polygon(0, 0, 0, 0, 0, 0, 0, 0, state=tk.HIDDEN)
+                      for _ in range(Particles.MAX_PARTICLES)]
+
+    def update(self):
+        particles = self.particles
+        signature = [meta_pixel.get_rgba() for meta_pixel in self.editor.meta_pixels]
+        if signature != self.signature:
+            self.signature = signature
+            self.system = particles.ParticleSystem([particles.Emitter.from_meta_pixels(self.editor.meta_pixels)])
+        self.system.step()
+
+        alpha = self.system.alpha()
+        corners = self.system.corners(self.SCALE)
+        for i, item in enumerate(self.items):
+            if i < len(alpha) and 0 < alpha[i]:
+                self.canvas.coords(item, *corners[i].tolist())
+                self.canvas.itemconfigure(item, fill=self.color(alpha[i], particles.PARTICLE_COLOR), state=tk.NORMAL)
+            else:
+                self.canvas.itemconfigure(item, state=tk.HIDDEN)
+
+
+class CapePreview(Preview):
+    def __init__(self, editor):
+        Preview.__init__(self, editor, "Cape Preview", Capes.FRAME_SIZE)
+        self.frame = 0
+
+        self.duck = self.canvas.create_rectangle(0, 0, 0, 0, outline="white", tags="duck")
+        self.items = [self.canvas.create_polygon(0, 0, 0, 0, 0, 0, 0, 0, outline="", tags="cape")
+                      for _ in range(Capes.SEGMENTS)]
+
+    def update(self):
+        parameters = Capes.CapeParameters.from_meta_pixels(self.editor.meta_pixels)
+        frames = Capes.render_cape(parameters)
+        frame = self.frame = (self.frame+1) % Capes.FRAMES
+
+        x, y = Capes.DUCK_PATH[frame]
+        width, height = Capes.DUCK_SIZE
+        self.canvas.coords(self.duck, (x-width/2)*self.SCALE, (y-height/2)*self.SCALE, (x+width/2)*self.SCALE,
+                           (y+height/2)*self.SCALE)
+        for item, (polygon, alpha) in zip(self.items, frames[frame]):
+            self.canvas.coords(item, *(value*self.SCALE for value in polygon))
+            self.canvas.itemconfigure(item, fill=self.color(alpha, Capes.CAPE_COLOR))
+        if parameters.foreground: self.canvas.tag_raise("cape", "duck")
+        else: self.canvas.tag_lower("cape", "duck")
+
+
 class Editor:
-    def __init__(self):
+    VISIBLE_ROWS = 16
+
+    def __init__(self, mainloop=True):
         # Image stuff
-        self.icon = """iVBORw0KGgoAAAANSUhEUgAAAGAAAABgCAYAAADimHc4AAABhWlDQ1
-        BJQ0MgcHJvZmlsZQAAKJF9kT1Iw0AcxV9bpUVbHCwoIpihOlkQFXGUKhbBQmkrtOpgcukXNGlIUl
-        wcBdeCgx+LVQcXZ10dXAVB8APEydFJ0UVK/F9SaBHjwXE/3t173L0DvI0KU4yuCUBRTT0VjwnZ3K
-        rgf0UvBhBACCMiM7REejED1/F1Dw9f76I8y/3cnyMk5w0GeATiOabpJvEG8cymqXHeJw6zkigTnx
-        OP63RB4keuSw6/cS7a7OWZYT2TmicOEwvFDpY6mJV0hXiaOCIrKuV7sw7LnLc4K5Uaa92TvzCYV1
-        fSXKc5jDiWkEASAiTUUEYFJqK0qqQYSNF+zMU/ZPuT5JLIVQYjxwKqUCDafvA/+N2tUZiadJKCMa
-        D7xbI+RgH/LtCsW9b3sWU1TwDfM3Cltv3VBjD7SXq9rUWOgL5t4OK6rUl7wOUOMPikibpoSz6a3k
-        IBeD+jb8oB/bdAz5rTW2sfpw9AhrpavgEODoGxImWvu7w70Nnbv2da/f0AYUpyoBrfN9UAAAAGYk
-        tHRABYAFgAWPY/mbsAAAAJcEhZcwAACxMAAAsTAQCanBgAAAAHdElNRQfkCxcIFCWQpv+pAAAAGX
-        RFWHRDb21tZW50AENyZWF0ZWQgd2l0aCBHSU1QV4EOFwAAAdFJREFUeNrt3a1OA0EUhuFdUo9BIi
-        AkGILAQ4LFI1YgoIQbQIAA2YpeRAmyDtkQDAnFYggGBAgMQTS9AriBOWKShaXleeXJdNuZN2fzZf
-        anZVVVBZpjzhIQQAAIIAAEEAACCAABBOD3aOV+YDAYfKXqVVWVllMHEAACCAAB05+CorSzf3qeHH
-        /Z60hHOoAAEEAACJiBFBSxtbqcTkGZaQo6gAAQQAABaJQy9+7oulLNZ2+jlgksnDykJ1amt6D6/f
-        6PLmi73c76PTrAKYgAEEAAGqJV14F2NteS9eHoKVm/fpnU88VHK7Uc5u75NVmP9r6i8cXFhQ5wCg
-        IBBICAqU5B0Z7P7dJ6cvz26DFZj/Ze9g4PG5lwmF4aGq8DnIIIAAEE4K+loFzCdBSknWjvaPfguJ
-        bUcdnrJOsf91c6AAQQAAIIQI0p6GY8TtbP5heT9W5wpWw4qmePKHo27a/dra0DCCAABBCAhiiLos
-        i68hWlnYju5D0rpUTM6nuKdAABBIAAAjAtKSgiSkdRCsplVt87pAMIIAAEEICGyL4ilpt2vDVRBx
-        AAAggAAdOVgrbfHq2ODiAABBAAAmaX0n/K6wACQAABIIAAEEAACCAABPwbvgGpc2uukqDTSwAAAA
-        BJRU5ErkJggg=="""
         self.image = None
+        self.source = None
+        self.path = None
+        self.journal = None
+        self.journal_reported = False
 
         self.meta_pixel_keys = []
         self.meta_pixels = []
+        self.meta_pixel_index = {}
+        self.top = 0
+        self.chooser = None
+        self.preview = None
+        self.cape_preview = None
+        self.history = History()
 
-        self.pixels = None
         # self.image.save("pixel_grid.png")
 
         # Gui Stuff
@@ -677,6 +464,15 @@ class Editor:
         tk.Label(self.frame1, text="▼", justify=tk.LEFT, pady=0, borderwidth=1, bg="Aqua"). \
             grid(column=8, row=0, sticky=tk.NSEW)
 
+        self.scrollbar = tk.Scrollbar(self.frame1, orient=tk.VERTICAL, command=self.on_scroll)
+        self.scrollbar.grid(column=9, row=0, rowspan=self.VISIBLE_ROWS+1, sticky=tk.NS)
+        self.root.bind('<MouseWheel>', self.on_mouse_wheel)
+        self.root.bind('<Button-4>', self.on_mouse_wheel)
+        self.root.bind('<Button-5>', self.on_mouse_wheel)
+        self.root.bind('<Control-z>', self.undo)
+        self.root.bind('<Control-y>', self.redo)
+        self.root.bind('<Control-Z>', self.redo)
+
         self.frame3 = tk.Frame(self.root, borderwidth=0)
         self.frame3.grid(column=1, row=0, sticky=tk.NSEW)
 
@@ -692,183 +488,298 @@ class Editor:
         button["command"] = self.click_load
         button.grid(column=0, row=3, sticky=tk.NSEW)
 
+        button = tk.Button(self.frame3, text="Particles", justify=tk.LEFT, pady=0, borderwidth=1, bg="PaleGreen")
+        button["command"] = self.click_particles
+        button.grid(column=0, row=4, sticky=tk.NSEW)
+
+        button = tk.Button(self.frame3, text="Cape", justify=tk.LEFT, pady=0, borderwidth=1, bg="PaleGreen")
+        button["command"] = self.click_cape
+        button.grid(column=0, row=5, sticky=tk.NSEW)
+
         # Final Gui pixel stuff
         self.metas = []
         self.gen_meta_pixels()
 
-        self.root.bind_all('<KeyPress>', self.key_stuff)
-        self.root.bind_all('<KeyRelease>', self.key_stuff)
-
         self.root.title("DuckGame hat MetaPixel Editor")
-        self.root.iconphoto(False, tk.PhotoImage(data=self.icon))
+        self.photo = tk.PhotoImage(master=self.root, data=ICON)
+        self.root.iconphoto(True, self.photo)
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         self.root.resizable(width=False, height=False)
-        self.add_open = False
-        self.root.mainloop()
-
-    def key_stuff(self, _):
-        for meta in self.metas:
-            meta.key_event()
+        if mainloop:
+            self.recover()
+            self.root.mainloop()
 
     def click_save(self):
         if self.image is None:
             showinfo(title="Can't Save MetaPixels", message="You haven't loaded a hat yet so you aren't able to save a "
                                                           "hat")
             return
-        image_file = asksaveasfile(title="Select file to save as", filetypes=[('PNG Files', '*.png')])
-        if image_file is None: return
-        for p in range(len(self.meta_pixels)):
-            meta_pixel = self.meta_pixels[p]
-            assert isinstance(meta_pixel, MetaPixel)
-            self.pixels[96, p] = meta_pixel.get_rgba()
-        self.image.save(image_file.name)
-
-        image_file.close()
-
-    def click_load(self):
-        image_file = askopenfile(mode='r', title="Select file", filetypes=[('PNG Files', '*.png')])
-        if image_file is None: return
+        path = asksaveasfilename(title="Select file to save as", filetypes=[('PNG Files', '*.png')],
+                                 defaultextension=".png")
+        if not path: return
+        self.flush_changes()
         try:
-            image = Image.open(image_file.name)
-        except PIL.UnidentifiedImageError:
-            showinfo(title="Can't Open "+image_file.name, message="Wasn't able to identify file as image")
-            return
-
-        if image.format != "PNG":
-            showinfo(title="Can't Open "+image_file.name, message="Couldn't open file because it wasn't a PNG file")
+            data = encode_meta_png(self.source, self.meta_pixels)
+        except HatError as error:
+            showinfo(title="Can't Save MetaPixels", message=str(error))
             return
 
-        if image.size != (97, 56):
-            showinfo(title="Can't Open "+image_file.name, message="Couldn't open file because duck game hats need to be"
-                                                                  " (97, 56) pixels in size")
-            return
+        try:
+            with open(path, 'rb') as file:
+                unchanged = file.read() == data
+        except OSError:
+            unchanged = False
+        if not unchanged: write_file(path, data)
+        self.source = data
+        self.path = path
+        self.start_journal()
 
+    def click_load(self):
+        image_file = askopenfile(mode='rb', title="Select file", filetypes=[('PNG Files', '*.png')])
+        if image_file is None: return
         try:
-            image = image.convert('RGBA')
-        except ValueError:
-            showinfo(title="Can't Open " + image_file.name, message="Couldn't open file because it's color mode is "
-                                                                    "wrong")
+            source = image_file.read()
+            image = open_hat(io.BytesIO(source))
+        except HatError as error:
+            showinfo(title="Can't Open "+image_file.name, message=str(error))
             return
 
         self.meta_pixel_keys = []
         self.meta_pixels = []
         self.image = image
+        self.source = source
+        self.path = image_file.name
+        self.history.clear()
 
         image_file.close()
 
-        self.pixels = self.image.load()
         self.load()
         self.gen_meta_pixels()
+        self.start_journal()
+
+    def start_journal(self):
+        column = encode_meta_bytes(self.meta_pixels)
+        if self.journal is None or self.journal.error is not None:
+            self.journal = Journal(self.path, column)
+            self.journal_reported = False
+            self.history.listener = self.record_journal
+        else:
+            self.journal.restart(self.path, column)
+
+    def record_journal(self, record):
+        self.journal.append(record)
+        if self.journal.error is None or self.journal_reported: return
+        self.journal_reported = True
+        self.root.after_idle(self.report_journal)
+
+    def report_journal(self):
+        showinfo(title="Can't Journal MetaPixels", message="Unsaved edits can't be recovered after a crash because the "
+                                                           "journal couldn't be written: "+str(self.journal.error))
+
+    def recover(self):
+        for path in find_journals():
+            handle = lock_journal(path)
+            if handle is None: continue
+            journal = read_journal(path)
+            recover = False
+            if journal is not None and journal[2]:
+                message = "There are "+str(len(journal[2]))+" unsaved edits to "+journal[0]+" from an earlier " \
+                          "session, do you want to recover them?"
+                recover = askyesno(title="Recover Unsaved MetaPixels", message=message)
+            unlock_journal(handle)
+            if recover and self.recover_journal(*journal): return
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def recover_journal(self, hat_path, column: bytes, records):
+        try:
+            with open(hat_path, 'rb') as file:
+                source = file.read()
+            image = open_hat(io.BytesIO(source))
+        except (HatError, OSError) as error:
+            showinfo(title="Can't Recover "+hat_path, message=str(error))
+            return False
+
+        meta_pixels = replay_journal(column, records)
+        self.image = image
+        self.source = source
+        self.path = hat_path
+        self.meta_pixels = meta_pixels
+        self.meta_pixel_keys = [meta_pixel.type for meta_pixel in meta_pixels]
+        self.history.clear()
+        self.gen_meta_pixels()
+        self.start_journal()
+        return True
 
     def click_add(self):
-        if self.add_open: return
         if self.image is None:
             showinfo(title="Can't Add MetaPixel", message="You haven't loaded a hat yet so you aren't able to add a "
                                                           "MetaPixel")
             return
-        root = tk.Tk()
-
-        class Option:
-            def __init__(self, pixel_type: MetaPixelType, editor: Editor, r: tk.Tk):
-                self.root = r
-                self.editor = editor
-                self.button = tk.Button(root, text=pixel_type.name, justify=tk.LEFT, pady=0, borderwidth=1,
-                                        bg=MetaPixel.COLORS.get(pixel_type.value[3]))
-                self.button.pack(fill="x")
-                self.button["command"] = self.click
-
-                self.meta_pixel_type = pixel_type
-
-            def click(self):
-                meta_pixel = MetaPixel(self.meta_pixel_type, 0, 0)
-                self.editor.meta_pixel_keys.append(self.meta_pixel_type)
-                self.editor.meta_pixels.append(meta_pixel)
-                self.editor.gen_meta_pixels()
-                self.editor.add_open = False
-                self.root.quit()
-                self.root.destroy()
-
-        root.resizable(width=False, height=False)
-        for meta_pixel_type in MetaPixel.TYPES.values():
-            if self.meta_pixel_keys.__contains__(meta_pixel_type) and meta_pixel_type.value[0] < 100: continue
-            Option(meta_pixel_type, self, root)
-
-        self.add_open = True
-
-        root.iconphoto(False, tk.PhotoImage(master=root, data=self.icon))
-        root.mainloop(1)
-        self.add_open = False
+        if self.chooser is None: self.chooser = MetaPixelChooser(self)
+        self.chooser.show()
+
+    def click_particles(self):
+        if self.preview is None:
+            try:
+                self.preview = ParticlePreview(self)
+            except ImportError:
+                showinfo(title="Can't Preview Particles", message="The particle preview needs NumPy to be installed")
+                return
+        self.preview.show()
+
+    def click_cape(self):
+        if self.cape_preview is None: self.cape_preview = CapePreview(self)
+        self.cape_preview.show()
 
     def load(self):
-        for p in range(56):
-            r, g, b, a = self.pixels[96, p]
-
-            meta_pixel_type = MetaPixel.TYPES.get(r)
-            if meta_pixel_type is not None:
-                if not self.meta_pixel_keys.__contains__(meta_pixel_type) or 100 <= meta_pixel_type.value[0]:
-                    self.meta_pixel_keys.append(meta_pixel_type)
-                    self.meta_pixels.append(MetaPixel(meta_pixel_type, g, b))
-            self.pixels[96, p] = 0, 0, 0, 0
+        self.meta_pixels = decode_meta_column(self.image)
+        self.meta_pixel_keys = [meta_pixel.type for meta_pixel in self.meta_pixels]
 
     def add_meta_pixel(self, meta_pixel: MetaPixel):
-        self.metas.append(MetaPixelGui(meta_pixel, len(self.metas)+1, self.frame1, self.label, self))
+        index = self.meta_pixel_index[meta_pixel] = len(self.meta_pixels)-1
+        self.history.add(index, meta_pixel.get_rgba())
+        if len(self.metas) < self.VISIBLE_ROWS:
+            self.metas.append(MetaPixelGui(meta_pixel, len(self.metas)+1, self.frame1, self.label, self))
+            self.update_scrollbar()
+        else:
+            self.scroll_to(index)
+
+    def insert_meta_pixel(self, index: int, meta_pixel: MetaPixel):
+        self.flush_changes()
+        self.meta_pixels.insert(index, meta_pixel)
+        self.meta_pixel_keys.insert(index, meta_pixel.type)
+        self.resize_rows()
+        self.update_rows(index, len(self.meta_pixels)-1)
+        self.see(index)
+        self.refresh_chooser()
+        self.history.add(index, meta_pixel.get_rgba())
+
+    def resize_rows(self):
+        count = min(len(self.meta_pixels), self.VISIBLE_ROWS)
+        for meta in self.metas[count:]:
+            meta.flush_change()
+            meta.remove()
+        del self.metas[count:]
+        self.top = max(0, min(self.top, len(self.meta_pixels)-count))
+        for p in range(self.top+len(self.metas), self.top+count):
+            self.metas.append(MetaPixelGui(self.meta_pixels[p], len(self.metas)+1, self.frame1, self.label, self))
+
+    def flush_changes(self):
+        for meta in self.metas: meta.flush_change()
 
     def gen_meta_pixels(self):
-        for meta in self.metas: meta.remove()
-        self.metas = []
-        for item in self.meta_pixels: self.add_meta_pixel(item)
+        self.top = 0
+        self.resize_rows()
+        self.meta_pixel_index = {}
+        self.update_rows(0, len(self.meta_pixels)-1)
+        self.refresh_chooser()
+
+    def refresh_chooser(self):
+        if self.chooser is not None: self.chooser.refresh()
+
+    def update_rows(self, start: int, end: int):
+        for p in range(start, end+1):
+            self.meta_pixel_index[self.meta_pixels[p]] = p
+        for p in range(max(start, self.top), min(end, self.top+len(self.metas)-1)+1):
+            self.metas[p-self.top].set_pixel(self.meta_pixels[p])
+        self.update_scrollbar()
+
+    def update_scrollbar(self):
+        count = len(self.meta_pixels)
+        if count == 0: self.scrollbar.set(0.0, 1.0)
+        else: self.scrollbar.set(self.top/count, (self.top+len(self.metas))/count)
+
+    def scroll_to(self, top: int):
+        top = max(0, min(top, len(self.meta_pixels)-len(self.metas)))
+        if top == self.top: return
+        self.top = top
+        self.update_rows(top, top+len(self.metas)-1)
+
+    def see(self, index: int):
+        if index < self.top: self.scroll_to(index)
+        elif self.top+len(self.metas) <= index: self.scroll_to(index-len(self.metas)+1)
+
+    def on_scroll(self, action, amount, unit=None):
+        if action == "moveto": self.scroll_to(round(float(amount)*len(self.meta_pixels)))
+        elif unit == "pages": self.scroll_to(self.top+int(amount)*len(self.metas))
+        else: self.scroll_to(self.top+int(amount))
+
+    def on_mouse_wheel(self, event):
+        self.scroll_to(self.top+(-1 if event.num == 4 or 0 < event.delta else 1))
 
     def remove_meta_pixel(self, meta_pixel: MetaPixel):
-        if self.meta_pixels.__contains__(meta_pixel):
-            self.meta_pixels.remove(meta_pixel)
-            self.meta_pixel_keys.remove(meta_pixel.type)
-            self.gen_meta_pixels()
+        self.flush_changes()
+        index = self.meta_pixel_index.pop(meta_pixel, None)
+        if index is None: return
+        self.history.remove(index, meta_pixel.get_rgba())
+        del self.meta_pixels[index]
+        del self.meta_pixel_keys[index]
+        self.resize_rows()
+        self.update_rows(min(index, self.top), len(self.meta_pixels)-1)
+        self.refresh_chooser()
+
+    def swap_meta_pixels(self, i: int, u: int):
+        self.flush_changes()
+        self.meta_pixels[i], self.meta_pixels[u] = self.meta_pixels[u], self.meta_pixels[i]
+        self.meta_pixel_keys[i], self.meta_pixel_keys[u] = self.meta_pixel_keys[u], self.meta_pixel_keys[i]
+        self.update_rows(i, i)
+        self.update_rows(u, u)
+        self.see(u)
+        self.history.swap(i, u)
+
+    def move_meta_pixel(self, meta_pixel: MetaPixel, position: int):
+        index = self.meta_pixel_index.get(meta_pixel)
+        if index is None: return
+        position = max(0, min(position, len(self.meta_pixels)-1))
+        if index == position: return
+        self.flush_changes()
+        self.meta_pixels.insert(position, self.meta_pixels.pop(index))
+        self.meta_pixel_keys.insert(position, self.meta_pixel_keys.pop(index))
+        self.update_rows(min(index, position), max(index, position))
+        self.see(position)
+        self.history.move(index, position)
 
     def move_meta_pixel_up(self, meta_pixel: MetaPixel):
-        if self.meta_pixels.__contains__(meta_pixel):
-            for i in range(len(self.meta_pixels)):
-                if self.meta_pixels[i] == meta_pixel:
-                    u = i-1 if 0 < i else len(self.meta_pixel_keys)-1
-                    move_down = self.meta_pixel_keys[u]
-                    self.meta_pixel_keys[i] = move_down
-                    self.meta_pixel_keys[u] = meta_pixel.type
-
-                    self.metas[i].remove()
-                    self.metas[u].remove()
-
-                    move_down = self.meta_pixels[u]
-                    self.meta_pixels[u] = meta_pixel
-                    self.meta_pixels[i] = move_down
-
-                    self.metas[i] = MetaPixelGui(move_down, i+1, self.frame1, self.label, self)
-                    self.metas[u] = MetaPixelGui(meta_pixel, u+1, self.frame1, self.label, self)
-                    return
+        i = self.meta_pixel_index.get(meta_pixel)
+        if i is None: return
+        self.swap_meta_pixels(i, i-1 if 0 < i else len(self.meta_pixels)-1)
 
     def move_meta_pixel_down(self, meta_pixel: MetaPixel):
-        if self.meta_pixels.__contains__(meta_pixel):
-            for i in range(len(self.meta_pixels)):
-                if self.meta_pixels[i] == meta_pixel:
-                    u = i+1 if i < len(self.meta_pixel_keys) - 1 else 0
-                    move_up = self.meta_pixel_keys[u]
-                    self.meta_pixel_keys[u] = meta_pixel.type
-                    self.meta_pixel_keys[i] = move_up
-
-                    self.metas[i].remove()
-                    self.metas[u].remove()
-
-                    move_up = self.meta_pixels[u]
-                    self.meta_pixels[u] = meta_pixel
-                    self.meta_pixels[i] = move_up
-
-                    self.metas[i] = MetaPixelGui(move_up, i+1, self.frame1, self.label, self)
-                    self.metas[u] = MetaPixelGui(meta_pixel, u+1, self.frame1, self.label, self)
-                    return
+        i = self.meta_pixel_index.get(meta_pixel)
+        if i is None: return
+        self.swap_meta_pixels(i, i+1 if i < len(self.meta_pixels)-1 else 0)
+
+    def replay(self, record, undo: bool):
+        op, index, target, r, old_g, old_b, new_g, new_b = record
+        if op == CHANGE:
+            self.meta_pixels[index].set_colors(*((old_g, old_b) if undo else (new_g, new_b)))
+            self.update_rows(index, index)
+            self.see(index)
+        elif op == MOVE:
+            if undo: self.move_meta_pixel(self.meta_pixels[target], index)
+            else: self.move_meta_pixel(self.meta_pixels[index], target)
+        elif op == SWAP: self.swap_meta_pixels(index, target)
+        elif (op == ADD) == undo: self.remove_meta_pixel(self.meta_pixels[index])
+        else: self.insert_meta_pixel(index, MetaPixel(MetaPixel.TYPES[r], old_g, old_b))
+
+    def undo(self, _=None):
+        self.flush_changes()
+        self.history.undo(self.replay)
+
+    def redo(self, _=None):
+        self.flush_changes()
+        self.history.redo(self.replay)
 
     def on_closing(self):
         if self.image is None:
             self.root.destroy()
             return
-        if askokcancel("Quit Prompt", "Do you want to exit? Any unsaved data will be lost!"): self.root.destroy()
+        if not askokcancel("Quit Prompt", "Do you want to exit? Any unsaved data will be lost!"): return
+        if self.journal is not None: self.journal.close(delete=True)
+        self.root.destroy()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,445 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+from MetaPixels import MetaPixelType, MetaPixel
+from Codec import TYPE_TABLE, ZLIB_LEVEL, HatError, open_meta_column, decode_meta_values, write_meta_column, \
+    output_path
+from Archive import is_archive, iter_archive_hats, index_archive, rewrite_archive
+from Library import QueryError, LibraryIndex
+from Cache import MetaPixelCache
+from Patch import PatchError, parse_operation, patch_hat
+from Diff import diff_columns
+
+
+def is_hat_path(path):
+    return path.lower().endswith(".png")
+
+
+def iter_hats(paths):
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for directory, directories, files in os.walk(path):
+            directories.sort()
+            for name in sorted(files):
+                if is_hat_path(name): yield os.path.join(directory, name)
+
+
+def hats_root(paths):
+    return os.path.commonpath([os.path.abspath(path) if os.path.isdir(path) else os.path.dirname(os.path.abspath(path))
+                              for path in paths])
+
+
+def meta_values_to_dict(meta_pixel_type: MetaPixelType, g: int, b: int, values):
+    return {"type": meta_pixel_type.name, "g": g, "b": b, "values": list(values)}
+
+
+def meta_pixel_from_dict(item):
+    return MetaPixel(MetaPixelType[item["type"]], int(item["g"]), int(item["b"]))
+
+
+def hat_result(path, meta_values, error=None):
+    if error is not None: return {"path": path, "error": error}
+    return {"path": path, "meta_pixels": [meta_values_to_dict(*row) for row in meta_values]}
+
+
+def read_column(path):
+    try:
+        return open_meta_column(path), None
+    except (HatError, OSError) as error:
+        return None, str(error)
+
+
+def read_columns(paths, cache=None, jobs=None, batch_size=256):
+    paths = iter(paths)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        while True:
+            batch = list(islice(paths, batch_size))
+            if not batch: return
+
+            keys = [None]*len(batch)
+            results = [None]*len(batch)
+            if cache is not None:
+                for i in range(len(batch)):
+                    try:
+                        keys[i] = cache.key(batch[i])
+                    except OSError:
+                        continue
+                    data = cache.get(keys[i])
+                    if data is not None: results[i] = data, None
+
+            misses = [i for i in range(len(batch)) if results[i] is None]
+            for i, result in zip(misses, executor.map(read_column, [batch[i] for i in misses], chunksize=8)):
+                results[i] = result
+                if cache is not None and keys[i] is not None and result[0] is not None: cache.put(keys[i], result[0])
+
+            for path, (data, error) in zip(batch, results): yield path, data, error
+
+
+def open_cache(arguments):
+    if arguments.cache is None: return None
+    return MetaPixelCache(path=arguments.cache, hash_content=arguments.hash_content)
+
+
+def close_cache(cache):
+    if cache is None: return
+    print("Cache: "+str(cache.hits)+" hits, "+str(cache.misses)+" misses", file=sys.stderr)
+    cache.close()
+
+
+def validate_column(path, data, error=None):
+    diagnostics = []
+
+    def report(level, message, row=None):
+        diagnostics.append({"level": level, "row": row, "message": message})
+
+    if error is not None:
+        report("error", error)
+        data = b""
+
+    keys = set()
+    for row in range(len(data)//4):
+        r, g, b, a = data[row*4:row*4+4]
+        meta_pixel_type = TYPE_TABLE[r]
+        if meta_pixel_type is None:
+            if a != 0: report("warning", "Unknown MetaPixel R value "+str(r), row)
+            continue
+        if meta_pixel_type in keys and r < 100:
+            report("warning", meta_pixel_type.name+" is already defined above so this one is ignored", row)
+            continue
+        keys.add(meta_pixel_type)
+
+        color_ranges = meta_pixel_type.value[1].generate().get_color_range()
+        for channel, value, color_range in zip(("Green", "Blue"), (g, b), color_ranges):
+            if color_range is None:
+                if value != 0: report("warning", channel+" value "+str(value)+" of "+meta_pixel_type.name+" is unused",
+                                      row)
+            elif not color_range[0] <= value <= color_range[1]:
+                report("error", channel+" value "+str(value)+" of "+meta_pixel_type.name+" is outside of "
+                       + str(color_range[0])+" to "+str(color_range[1]), row)
+
+    valid = not any(diagnostic["level"] == "error" for diagnostic in diagnostics)
+    return {"path": path, "valid": valid, "diagnostics": diagnostics}
+
+
+def change_to_dict(meta_pixel_type: MetaPixelType, attached, before, after):
+    change = {"type": meta_pixel_type.name}
+    if attached is not None: change["of"] = attached.name
+    change["change"] = "added" if before is None else "removed" if after is None else "changed"
+    for name, row in (("before", before), ("after", after)):
+        if row is not None: change[name] = {"g": row[1], "b": row[2], "values": list(row[3])}
+    return change
+
+
+def diff_result(path, before, after):
+    if before is None: return {"path": path, "change": "added"}
+    if after is None: return {"path": path, "change": "removed"}
+    errors = [error for data, error in (before, after) if error is not None]
+    if errors: return {"path": path, "error": "; ".join(errors)}
+    return {"path": path, "changes": [change_to_dict(*change) for change in diff_columns(before[0], after[0])]}
+
+
+def hat_pairs(before, after):
+    if not (os.path.isdir(before) and os.path.isdir(after)): return [(after, before, after)]
+    old = {os.path.relpath(path, before): path for path in iter_hats([before])}
+    new = {os.path.relpath(path, after): path for path in iter_hats([after])}
+    return [(name, old.get(name), new.get(name)) for name in sorted(old.keys() | new.keys())]
+
+
+def read_edits(file):
+    edits = {}
+    for line in file:
+        if not line.strip(): continue
+        item = json.loads(line)
+        if "meta_pixels" in item: edits[item["path"]] = item["meta_pixels"]
+    return edits
+
+
+def command_decode(arguments):
+    cache = open_cache(arguments)
+    for path in arguments.paths:
+        if is_hat_path(path) or not is_archive(path):
+            for hat, data, error in read_columns(iter_hats([path]), cache, arguments.jobs):
+                print(json.dumps(hat_result(hat, None if data is None else decode_meta_values(data), error)))
+            continue
+        for name, meta_values, error in iter_archive_hats(path):
+            print(json.dumps(hat_result(path+":"+name, meta_values, error)))
+    close_cache(cache)
+    return 0
+
+
+def command_index(arguments):
+    index = index_archive(arguments.archive)
+    index.save(arguments.output or arguments.archive+".index.json")
+    print(str(len(index.hats))+" hats indexed, "+str(len(index.errors))+" couldn't be read")
+    for name in sorted(index.types): print(name+": "+str(len(index.types[name]))+" hats")
+    return 0
+
+
+def command_repack(arguments):
+    edits = read_edits(arguments.edits)
+    prefix = arguments.archive+":"
+
+    def edit(name):
+        items = edits.get(name, edits.get(prefix+name))
+        if items is None: return None
+        return [meta_pixel_from_dict(item) for item in items]
+
+    changed = rewrite_archive(arguments.archive, arguments.output, edit, arguments.zlib_level)
+    print(str(changed)+" hats rewritten")
+    return 0
+
+
+def command_encode(arguments):
+    items = [json.loads(line) for line in arguments.input if line.strip()]
+    items = [item for item in items if "meta_pixels" in item and "path" in item]
+    root = None
+    if arguments.output is not None and items:
+        root = os.path.abspath(arguments.root) if arguments.root else \
+            os.path.commonpath([os.path.dirname(os.path.abspath(item["path"])) for item in items])
+
+    failed = 0
+    for item in items:
+        try:
+            output = None
+            if root is not None:
+                output = output_path(item["path"], root, arguments.output)
+                os.makedirs(os.path.dirname(output), exist_ok=True)
+            write_meta_column(item["path"], [meta_pixel_from_dict(meta_pixel) for meta_pixel in item["meta_pixels"]],
+                              output, arguments.zlib_level)
+        except (HatError, OSError, KeyError) as error:
+            print(item["path"]+": "+str(error), file=sys.stderr)
+            failed += 1
+    return 1 if failed else 0
+
+
+def command_validate(arguments):
+    failed = 0
+    cache = open_cache(arguments)
+    for path, data, error in read_columns(iter_hats(arguments.paths), cache, arguments.jobs):
+        result = validate_column(path, data, error)
+        print(json.dumps(result))
+        if not result["valid"]: failed += 1
+    close_cache(cache)
+    return 1 if failed else 0
+
+
+def command_diff(arguments):
+    pairs = hat_pairs(arguments.before, arguments.after)
+    cache = open_cache(arguments)
+    paths = [path for name, before, after in pairs for path in (before, after) if path is not None]
+    columns = {path: (data, error) for path, data, error in read_columns(paths, cache, arguments.jobs)}
+    close_cache(cache)
+
+    different = 0
+    for name, before, after in pairs:
+        result = diff_result(name, columns.get(before), columns.get(after))
+        if result.get("changes") == []: continue
+        print(json.dumps(result))
+        different += 1
+    return 1 if different else 0
+
+
+def command_query(arguments):
+    index = LibraryIndex(arguments.library, arguments.index).load()
+    if not arguments.no_update:
+        changed = index.update(arguments.jobs)
+        if changed: print(str(changed)+" hats indexed", file=sys.stderr)
+    try:
+        paths = index.query(arguments.expression)
+    except QueryError as error:
+        print(str(error), file=sys.stderr)
+        return 2
+    for path in paths: print(path)
+    return 0
+
+
+def command_patch(arguments):
+    try:
+        operations = [parse_operation(text) for text in arguments.operations]
+    except PatchError as error:
+        print(str(error), file=sys.stderr)
+        return 2
+
+    failed = changed = 0
+    with ProcessPoolExecutor(max_workers=arguments.jobs) as executor:
+        for result in executor.map(partial(patch_hat, operations=operations, dry_run=arguments.dry_run,
+                                           level=arguments.zlib_level), iter_hats(arguments.paths), chunksize=8):
+            if "error" in result: failed += 1
+            elif result["changed"]: changed += 1
+            else: continue
+            print(json.dumps(result))
+    print(str(changed)+" hats "+("would be " if arguments.dry_run else "")+"patched, "+str(failed)+" failed",
+          file=sys.stderr)
+    return 1 if failed else 0
+
+
+def command_particles(arguments):
+    try:
+        from Particles import render_strips
+    except ImportError as error:
+        print("Particle previews need NumPy: "+str(error), file=sys.stderr)
+        return 2
+
+    os.makedirs(arguments.output, exist_ok=True)
+    render = partial(render_strips, output=arguments.output, root=hats_root(arguments.paths), frames=arguments.frames,
+                     every=arguments.every, scale=arguments.scale, seed=arguments.seed)
+    paths = iter_hats(arguments.paths)
+    failed = rendered = 0
+    with ProcessPoolExecutor(max_workers=arguments.jobs) as executor:
+        for results in executor.map(render, iter(lambda: list(islice(paths, arguments.batch_size)), [])):
+            for path, target, error in results:
+                if error is not None:
+                    print(path+": "+error, file=sys.stderr)
+                    failed += 1
+                elif target is not None:
+                    print(target)
+                    rendered += 1
+    print(str(rendered)+" particle previews rendered, "+str(failed)+" failed", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def command_thumbnails(arguments):
+    try:
+        from Thumbnails import load_manifest, save_manifest, render_thumbnails
+    except ImportError as error:
+        print("Thumbnails need NumPy: "+str(error), file=sys.stderr)
+        return 2
+
+    os.makedirs(arguments.output, exist_ok=True)
+    root = hats_root(arguments.paths)
+    settings = {"scale": arguments.scale, "root": root}
+    hats = {} if arguments.force else load_manifest(arguments.output, settings)
+    render = partial(render_thumbnails, output=arguments.output, root=root, scale=arguments.scale)
+    items = ((path, hats.get(os.path.abspath(path))) for path in iter_hats(arguments.paths))
+    failed = rendered = skipped = 0
+    try:
+        with ProcessPoolExecutor(max_workers=arguments.jobs) as executor:
+            for results in executor.map(render, iter(lambda: list(islice(items, arguments.batch_size)), [])):
+                for path, digest, targets, error in results:
+                    if error is not None:
+                        print(path+": "+error, file=sys.stderr)
+                        hats.pop(os.path.abspath(path), None)
+                        failed += 1
+                        continue
+                    hats[os.path.abspath(path)] = digest
+                    if targets is None:
+                        skipped += 1
+                        continue
+                    for target in targets: print(target)
+                    rendered += 1
+    finally:
+        save_manifest(arguments.output, settings, hats)
+    print(str(rendered)+" hats rendered, "+str(skipped)+" unchanged, "+str(failed)+" failed", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def add_reader_arguments(parser):
+    parser.add_argument("--jobs", type=int, default=None, help="Number of worker processes, defaults to all cores")
+    parser.add_argument("--cache", help="SQLite file to cache decoded meta columns in between runs")
+    parser.add_argument("--hash-content", action="store_true",
+                        help="Key the cache by file content instead of path, modification time & size")
+
+
+def add_writer_arguments(parser):
+    parser.add_argument("--zlib-level", type=int, default=ZLIB_LEVEL, choices=range(10),
+                        help="zlib level for rewritten image data, lower is faster (default "+str(ZLIB_LEVEL)+")")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless tools for DuckGame hat MetaPixels")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    decode = commands.add_parser("decode", help="Print the MetaPixels of every hat as JSON lines")
+    decode.add_argument("paths", nargs="+", help="Hat files, directories of hats or zip/tar hat packs")
+    add_reader_arguments(decode)
+    decode.set_defaults(function=command_decode)
+
+    encode = commands.add_parser("encode", help="Write MetaPixels from JSON lines (as printed by decode) into hats")
+    encode.add_argument("input", nargs="?", type=argparse.FileType('r'), default=sys.stdin,
+                        help="JSON lines file, defaults to stdin")
+    encode.add_argument("--output", help="Directory to write the hats to instead of overwriting them, keeping their "
+                                         "paths relative to --root")
+    encode.add_argument("--root", help="Directory the decoded paths are relative to, defaults to their common "
+                                       "directory")
+    add_writer_arguments(encode)
+    encode.set_defaults(function=command_encode)
+
+    validate = commands.add_parser("validate", help="Check every hat and print a JSON lines report")
+    validate.add_argument("paths", nargs="+", help="Hat files or directories of hats")
+    add_reader_arguments(validate)
+    validate.set_defaults(function=command_validate)
+
+    index = commands.add_parser("index", help="Build a sidecar index of MetaPixel types & value ranges for a hat pack")
+    index.add_argument("archive", help="zip or tar hat pack")
+    index.add_argument("--output", help="Where to write the index, defaults to ARCHIVE.index.json")
+    index.set_defaults(function=command_index)
+
+    repack = commands.add_parser("repack", help="Copy a hat pack, rewriting the hats listed in JSON lines edits")
+    repack.add_argument("archive", help="zip or tar hat pack")
+    repack.add_argument("output", help="Hat pack to write")
+    repack.add_argument("edits", nargs="?", type=argparse.FileType('r'), default=sys.stdin,
+                        help="JSON lines (as printed by decode) keyed by member name, defaults to stdin")
+    add_writer_arguments(repack)
+    repack.set_defaults(function=command_repack)
+
+    diff = commands.add_parser("diff", help="Compare the MetaPixels of two hats or hat directories type by type and "
+                                            "print a JSON line for every hat that differs")
+    diff.add_argument("before", help="Hat file or directory of hats")
+    diff.add_argument("after", help="Hat file or directory of hats, matched to BEFORE by relative path")
+    add_reader_arguments(diff)
+    diff.set_defaults(function=command_diff)
+
+    query = commands.add_parser("query", help="Find hats in a library, e.g. \"CapeIsTrail and ParticleCount > 6\" or "
+                                              "\"HatOffset.y < -4\"")
+    query.add_argument("library", help="Directory of hats")
+    query.add_argument("expression", help="Terms like Type, not Type or Type[.x|.y] < number joined by and/or")
+    query.add_argument("--index", help="Index directory, defaults to LIBRARY/.metapixel-index")
+    query.add_argument("--no-update", action="store_true", help="Don't re-index changed hats first")
+    query.add_argument("--jobs", type=int, default=None, help="Number of worker processes for re-indexing")
+    query.set_defaults(function=command_query)
+
+    patch = commands.add_parser("patch", help="Set, offset, clamp or remove a MetaPixel across many hats, e.g. "
+                                              "-e \"set ParticleCount=4\" -e \"offset HatOffset +1,0\"")
+    patch.add_argument("paths", nargs="+", help="Hat files or directories of hats")
+    patch.add_argument("-e", "--operation", dest="operations", action="append", required=True,
+                       help="set Type[=a[,b]], offset Type a[,b], clamp Type min,max or remove Type, "
+                            "applied in the given order")
+    patch.add_argument("--dry-run", action="store_true", help="Only print what would change")
+    patch.add_argument("--jobs", type=int, default=None, help="Number of worker processes, defaults to all cores")
+    add_writer_arguments(patch)
+    patch.set_defaults(function=command_patch)
+
+    particles = commands.add_parser("particles", help="Simulate the particle MetaPixels of every hat and write a strip "
+                                                      "of preview frames for each hat that has particles")
+    particles.add_argument("paths", nargs="+", help="Hat files or directories of hats")
+    particles.add_argument("--output", required=True, help="Directory to write NAME.particles.png strips to")
+    particles.add_argument("--frames", type=int, default=12, help="Frames per strip")
+    particles.add_argument("--every", type=int, default=5, help="Simulation steps (at 60 per second) between frames")
+    particles.add_argument("--scale", type=int, default=1, help="Integer upscale of the strips")
+    particles.add_argument("--seed", type=int, default=0, help="Random seed, so strips are reproducible")
+    particles.add_argument("--batch-size", type=int, default=64, help="Hats simulated together by one worker")
+    particles.add_argument("--jobs", type=int, default=None, help="Number of worker processes, defaults to all cores")
+    particles.set_defaults(function=command_particles)
+
+    thumbnails = commands.add_parser("thumbnails", help="Write a PNG thumbnail & an animated GIF of every hat, "
+                                                        "recolored to each duck when it uses UseDuckColor")
+    thumbnails.add_argument("paths", nargs="+", help="Hat files or directories of hats")
+    thumbnails.add_argument("--output", required=True, help="Directory to write NAME.thumb.png & NAME.thumb.gif to")
+    thumbnails.add_argument("--scale", type=int, default=1, help="Integer upscale of the thumbnails")
+    thumbnails.add_argument("--force", action="store_true", help="Render every hat, even if its source didn't change")
+    thumbnails.add_argument("--batch-size", type=int, default=64, help="Hats rendered together by one worker")
+    thumbnails.add_argument("--jobs", type=int, default=None, help="Number of worker processes, defaults to all cores")
+    thumbnails.set_defaults(function=command_thumbnails)
+
+    arguments = parser.parse_args(argv)
+    return arguments.function(arguments)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+from array import array
+from MetaPixels import MetaPixel
+
+
+ADD = 1
+REMOVE = 2
+MOVE = 3
+SWAP = 4
+CHANGE = 5
+
+# op, index, target, r, old g, old b, new g, new b
+RECORD_SIZE = 8
+
+
+def inverse(record):
+    op, index, target, r, old_g, old_b, new_g, new_b = record
+    if op == ADD: return REMOVE, index, target, r, old_g, old_b, new_g, new_b
+    if op == REMOVE: return ADD, index, target, r, old_g, old_b, new_g, new_b
+    if op == MOVE: return MOVE, target, index, r, old_g, old_b, new_g, new_b
+    if op == CHANGE: return CHANGE, index, target, r, new_g, new_b, old_g, old_b
+    return record
+
+
+def apply_record(meta_pixels, record):
+    op, index, target, r, old_g, old_b, new_g, new_b = record
+    if op == ADD: meta_pixels.insert(index, MetaPixel(MetaPixel.TYPES[r], new_g, new_b))
+    elif op == REMOVE: del meta_pixels[index]
+    elif op == MOVE: meta_pixels.insert(target, meta_pixels.pop(index))
+    elif op == SWAP: meta_pixels[index], meta_pixels[target] = meta_pixels[target], meta_pixels[index]
+    elif op == CHANGE: meta_pixels[index].set_colors(new_g, new_b)
+
+
+class History:
+    LIMIT = 10000
+
+    def __init__(self, limit=None):
+        self.limit = limit or self.LIMIT
+        self.records = array('B')
+        self.position = 0
+        self.coalesce = None
+        self.replaying = False
+        self.listener = None
+
+    def __len__(self):
+        return self.position
+
+    def get(self, position: int):
+        return tuple(self.records[position*RECORD_SIZE:(position+1)*RECORD_SIZE])
+
+    def clear(self):
+        del self.records[:]
+        self.position = 0
+        self.coalesce = None
+
+    def record(self, op: int, index: int, target=0, r=0, old=(0, 0), new=(0, 0), key=None):
+        if self.replaying: return
+        if self.listener is not None: self.listener((op, index, target, r)+tuple(old)+tuple(new))
+        del self.records[self.position*RECORD_SIZE:]
+        if key is not None and key == self.coalesce:
+            start = (self.position-1)*RECORD_SIZE
+            if tuple(self.records[start+4:start+6]) == tuple(new):
+                del self.records[start:]
+                self.position -= 1
+                self.coalesce = None
+            else:
+                self.records[start+6:start+8] = array('B', new)
+            return
+
+        self.records.extend((op, index, target, r)+tuple(old)+tuple(new))
+        self.position += 1
+        self.coalesce = key
+        if self.limit+self.limit//10 <= self.position:
+            del self.records[:(self.position-self.limit)*RECORD_SIZE]
+            self.position = self.limit
+
+    def add(self, index: int, rgba):
+        self.record(ADD, index, r=rgba[0], old=rgba[1:3], new=rgba[1:3])
+
+    def remove(self, index: int, rgba):
+        self.record(REMOVE, index, r=rgba[0], old=rgba[1:3], new=rgba[1:3])
+
+    def move(self, index: int, position: int):
+        self.record(MOVE, index, position)
+
+    def swap(self, i: int, u: int):
+        if i != u: self.record(SWAP, i, u)
+
+    def change(self, index: int, old, new, field: int):
+        if tuple(old) == tuple(new): return
+        self.record(CHANGE, index, r=old[0], old=old[1:3], new=new[1:3], key=(index, field))
+
+    def undo(self, replay):
+        if self.position == 0: return False
+        self.position -= 1
+        self.replay(replay, self.get(self.position), True)
+        if self.listener is not None: self.listener(inverse(self.get(self.position)))
+        return True
+
+    def redo(self, replay):
+        if len(self.records) <= self.position*RECORD_SIZE: return False
+        self.position += 1
+        self.replay(replay, self.get(self.position-1), False)
+        if self.listener is not None: self.listener(self.get(self.position-1))
+        return True
+
+    def replay(self, replay, record, undo: bool):
+        self.coalesce = None
+        self.replaying = True
+        try:
+            replay(record, undo)
+        finally:
+            self.replaying = False
@@ -0,0 +1,145 @@
+import hashlib
+import os
+import struct
+import threading
+from MetaPixels import MetaPixel
+from Codec import TYPE_TABLE, META_ROWS
+from History import RECORD_SIZE, apply_record
+
+
+JOURNAL_DIRECTORY = os.path.join(os.path.expanduser("~"), ".metapixel-editor", "journals")
+JOURNAL_MAGIC = b'MPJ1'
+COLUMN_SIZE = META_ROWS*4
+
+
+def journal_path(hat_path, directory=None):
+    name = hashlib.sha1(os.path.abspath(hat_path).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(directory or JOURNAL_DIRECTORY, name+".journal")
+
+
+def read_journal(path):
+    try:
+        with open(path, 'rb') as file:
+            data = file.read()
+    except OSError:
+        return None
+    if len(data) < 6 or data[:4] != JOURNAL_MAGIC: return None
+    length = struct.unpack('>H', data[4:6])[0]
+    start = 6+length+COLUMN_SIZE
+    if len(data) < start: return None
+    try:
+        hat_path = data[6:6+length].decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+    count = (len(data)-start)//RECORD_SIZE
+    records = [tuple(data[start+i*RECORD_SIZE:start+(i+1)*RECORD_SIZE]) for i in range(count)]
+    return hat_path, data[6+length:start], records
+
+
+def replay_journal(column: bytes, records):
+    meta_pixels = [MetaPixel(TYPE_TABLE[r], g, b) for r, g, b in zip(column[0::4], column[1::4], column[2::4])
+                   if TYPE_TABLE[r] is not None]
+    try:
+        for record in records: apply_record(meta_pixels, record)
+    except (IndexError, KeyError):
+        pass
+    return meta_pixels
+
+
+def lock_journal(path):
+    handle = os.open(path+".lock", os.O_RDWR | os.O_CREAT)
+    try:
+        if os.name == "nt":
+            import msvcrt
+            msvcrt.locking(handle, msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(handle)
+        return None
+    return handle
+
+
+def unlock_journal(handle):
+    os.close(handle)
+
+
+def find_journals(directory=None):
+    directory = directory or JOURNAL_DIRECTORY
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    paths = [os.path.join(directory, name) for name in names if name.endswith(".journal")]
+    return sorted(paths, key=os.path.getmtime, reverse=True)
+
+
+class Journal:
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, hat_path, column: bytes, directory=None):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.path = None
+        self.buffer = None
+        self.generation = 0
+        self.closed = False
+        self.delete = False
+        self.error = None
+        self.restart(hat_path, column)
+        self.thread = threading.Thread(target=self.run, name="Journal", daemon=True)
+        self.thread.start()
+
+    def restart(self, hat_path, column: bytes):
+        encoded = os.path.abspath(hat_path).encode("utf-8")
+        with self.lock:
+            self.path = journal_path(hat_path, self.directory)
+            self.buffer = bytearray(JOURNAL_MAGIC+struct.pack('>H', len(encoded))+encoded+column)
+            self.generation += 1
+
+    def append(self, record):
+        with self.lock:
+            if self.error is None: self.buffer.extend(record)
+
+    def run(self):
+        file = None
+        opened = None
+        handle = locked = None
+        generation = 0
+        try:
+            while True:
+                self.wake.wait(self.FLUSH_INTERVAL)
+                with self.lock:
+                    data, self.buffer = self.buffer, bytearray()
+                    path, restarted, generation = self.path, generation != self.generation, self.generation
+                if restarted:
+                    if file is not None: file.close()
+                    if opened is not None and opened != path: os.remove(opened)
+                    if locked != path:
+                        if handle is not None: unlock_journal(handle)
+                        os.makedirs(os.path.dirname(path), exist_ok=True)
+                        handle, locked = lock_journal(path), path
+                        if handle is None: raise OSError("Another editor is journaling "+path)
+                    file = open(path, 'wb')
+                    opened = path
+                if data:
+                    file.write(data)
+                    file.flush()
+                    os.fsync(file.fileno())
+                if self.closed: break
+        except OSError as error:
+            with self.lock:
+                self.error = error
+                self.buffer = bytearray()
+        finally:
+            if file is not None: file.close()
+            if self.delete and opened is not None and os.path.exists(opened): os.remove(opened)
+            if handle is not None: unlock_journal(handle)
+
+    def close(self, delete=False):
+        self.delete = delete
+        self.closed = True
+        self.wake.set()
+        self.thread.join()
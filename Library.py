@@ -0,0 +1,206 @@
+import json
+import operator
+import os
+import re
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from MetaPixels import MetaPixelType
+from Codec import HatError, open_meta_column, decode_meta_values
+
+
+INDEX_DIRECTORY = ".metapixel-index"
+INDEX_VERSION = 2
+NAN = float("nan")
+
+OPERATORS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "=": operator.eq,
+    "==": operator.eq,
+    "!=": operator.ne
+}
+TYPE_NAMES = {meta_pixel_type.name.lower(): meta_pixel_type for meta_pixel_type in MetaPixelType}
+TERM = re.compile(r"^(not\s+)?(\w+)(?:\.([xyab]))?(?:\s*(<=|>=|==|!=|<|>|=)\s*(-?\d+(?:\.\d*)?|-?\.\d+))?$",
+                  re.IGNORECASE)
+
+
+class QueryError(ValueError):
+    pass
+
+
+def load_numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def read_hat(path):
+    try:
+        return decode_meta_values(open_meta_column(path))
+    except (HatError, OSError):
+        return None
+
+
+class Column:
+    __slots__ = ("count", "value_a", "value_b")
+
+    def __init__(self, size: int):
+        self.count = array('B')
+        self.value_a = array('d') if 0 < size else None
+        self.value_b = array('d') if 1 < size else None
+
+    def arrays(self):
+        return [values for values in (self.count, self.value_a, self.value_b) if values is not None]
+
+    def append(self, count: int, values):
+        self.count.append(min(count, 255))
+        if self.value_a is not None: self.value_a.append(values[0] if values else NAN)
+        if self.value_b is not None: self.value_b.append(values[1] if values else NAN)
+
+    def copy_row(self, column, row: int):
+        for values, source in zip(self.arrays(), column.arrays()): values.append(source[row])
+
+
+class LibraryIndex:
+    def __init__(self, root, directory=None):
+        self.root = root
+        self.directory = directory or os.path.join(root, INDEX_DIRECTORY)
+        self.paths = []
+        self.mtimes = array('d')
+        self.sizes = array('q')
+        self.valid = array('B')
+        self.columns = {meta_pixel_type: Column(meta_pixel_type.value[1].generate().SIZE)
+                        for meta_pixel_type in MetaPixelType}
+
+    def load(self):
+        try:
+            with open(os.path.join(self.directory, "index.json")) as file:
+                header = json.load(file)
+        except (OSError, ValueError):
+            return self
+        if header.get("version") != INDEX_VERSION: return self
+
+        try:
+            self.read(header["rows"])
+        except (OSError, EOFError, ValueError, KeyError):
+            self.__init__(self.root, self.directory)
+        return self
+
+    def read(self, rows: int):
+        with open(os.path.join(self.directory, "paths.txt"), encoding="utf-8") as file:
+            self.paths = file.read().split("\n")[:rows]
+        if len(self.paths) != rows: raise EOFError("paths.txt is missing rows")
+        with open(os.path.join(self.directory, "stats.bin"), 'rb') as file:
+            self.mtimes.fromfile(file, rows)
+            self.sizes.fromfile(file, rows)
+            self.valid.fromfile(file, rows)
+        for meta_pixel_type, column in self.columns.items():
+            with open(os.path.join(self.directory, meta_pixel_type.name+".col"), 'rb') as file:
+                for values in column.arrays(): values.fromfile(file, rows)
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, "paths.txt"), 'w', encoding="utf-8") as file:
+            file.write("\n".join(self.paths))
+        with open(os.path.join(self.directory, "stats.bin"), 'wb') as file:
+            self.mtimes.tofile(file)
+            self.sizes.tofile(file)
+            self.valid.tofile(file)
+        for meta_pixel_type, column in self.columns.items():
+            with open(os.path.join(self.directory, meta_pixel_type.name+".col"), 'wb') as file:
+                for values in column.arrays(): values.tofile(file)
+        with open(os.path.join(self.directory, "index.json"), 'w') as file:
+            json.dump({"version": INDEX_VERSION, "rows": len(self.paths)}, file)
+
+    def add(self, path, mtime: float, size: int, meta_values):
+        self.paths.append(path)
+        self.mtimes.append(mtime)
+        self.sizes.append(size)
+        self.valid.append(meta_values is not None)
+
+        found = {}
+        for meta_pixel_type, g, b, values in meta_values or ():
+            if meta_pixel_type in found: found[meta_pixel_type][0] += 1
+            else: found[meta_pixel_type] = [1, values]
+        for meta_pixel_type, column in self.columns.items():
+            count, values = found.get(meta_pixel_type, (0, ()))
+            column.append(count, values)
+
+    def copy_row(self, index, row: int):
+        self.paths.append(index.paths[row])
+        self.mtimes.append(index.mtimes[row])
+        self.sizes.append(index.sizes[row])
+        self.valid.append(index.valid[row])
+        for meta_pixel_type, column in self.columns.items(): column.copy_row(index.columns[meta_pixel_type], row)
+
+    def scan(self):
+        for directory, directories, files in os.walk(self.root):
+            directories[:] = sorted(name for name in directories if name != INDEX_DIRECTORY)
+            for name in sorted(files):
+                if not name.lower().endswith(".png"): continue
+                path = os.path.join(directory, name)
+                stat = os.stat(path)
+                yield os.path.relpath(path, self.root), stat.st_mtime, stat.st_size
+
+    def update(self, jobs=None):
+        rows = {path: row for row, path in enumerate(self.paths)}
+        files = list(self.scan())
+        changed = [(path, mtime, size) for path, mtime, size in files
+                   if path not in rows or self.mtimes[rows[path]] != mtime or self.sizes[rows[path]] != size]
+        if not changed and len(files) == len(self.paths): return 0
+
+        paths = [os.path.join(self.root, path) for path, mtime, size in changed]
+        if len(paths) < 64:
+            decoded = dict(zip([path for path, mtime, size in changed], map(read_hat, paths)))
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                decoded = dict(zip([path for path, mtime, size in changed],
+                                   executor.map(read_hat, paths, chunksize=64)))
+
+        index = LibraryIndex(self.root, self.directory)
+        for path, mtime, size in files:
+            if path in decoded: index.add(path, mtime, size, decoded[path])
+            else: index.copy_row(self, rows[path])
+        self.paths, self.mtimes, self.sizes, self.valid = index.paths, index.mtimes, index.sizes, index.valid
+        self.columns = index.columns
+        self.save()
+        return len(changed)
+
+    def match(self, term: str):
+        match = TERM.match(term.strip())
+        if match is None: raise QueryError("Can't understand "+repr(term))
+        negate, name, component, comparison, number = match.groups()
+        meta_pixel_type = TYPE_NAMES.get(name.lower())
+        if meta_pixel_type is None: raise QueryError("Unknown MetaPixelType "+repr(name))
+        column = self.columns[meta_pixel_type]
+
+        values = None
+        if comparison is not None:
+            values = column.value_b if component is not None and component.lower() in "yb" else column.value_a
+            if values is None: raise QueryError(meta_pixel_type.name+" doesn't have that value")
+            compare, number = OPERATORS[comparison], float(number)
+
+        numpy = load_numpy()
+        if numpy is not None:
+            found = numpy.frombuffer(column.count, dtype=numpy.uint8) > 0
+            if values is not None: found &= compare(numpy.frombuffer(values, dtype=values.typecode), number)
+            if negate: found = (numpy.frombuffer(self.valid, dtype=numpy.uint8) > 0) & ~found
+            return set(numpy.flatnonzero(found).tolist())
+
+        rows = {row for row, count in enumerate(column.count) if count}
+        if values is not None: rows = {row for row in rows if compare(values[row], number)}
+        if negate: rows = {row for row, valid in enumerate(self.valid) if valid}.difference(rows)
+        return rows
+
+    def query(self, expression: str):
+        rows = set()
+        for alternative in re.split(r"\s+or\s+", expression.strip(), flags=re.IGNORECASE):
+            terms = re.split(r"\s+and\s+", alternative, flags=re.IGNORECASE)
+            found = self.match(terms[0])
+            for term in terms[1:]: found &= self.match(term)
+            rows |= found
+        return [os.path.join(self.root, self.paths[row]) for row in sorted(rows)]
@@ -0,0 +1,498 @@
+import enum
+from array import array
+from bisect import bisect_left
+
+
+class ValueType(enum.Enum):
+    Bool = 0
+    Int = 1
+    Float = 2
+    IntPair = 3
+    Vec2 = 4
+    NormVec2 = 5
+    Randomize = 6
+
+    def create_meta_pixel_value(self, kwargs):
+        if self.value == 0: return Bool()
+        elif self.value == 1: return Int(**kwargs)
+        elif self.value == 2: return Float(**kwargs)
+        elif self.value == 3: return IntPair(**kwargs)
+        elif self.value == 4: return Vec2(**kwargs)
+        elif self.value == 5: return NormalizedVec2(**kwargs)
+        elif self.value == 6: return Randomize()
+        return None
+
+
+class TypeHolder:
+    COLORS = {
+        0: "Snow2",
+        1: "cyan",
+        2: "Lime",
+        3: "DeepSkyBlue",
+        4: "Tan1",
+        5: "Maroon1",
+        6: "SlateBlue"
+    }
+
+    __slots__ = ("type", "kwargs", "value")
+
+    def __init__(self, meta_pixel_value_type: ValueType, **kwargs):
+        self.type = meta_pixel_value_type
+        self.kwargs = kwargs
+        self.value = None
+
+    def generate(self):
+        if self.value is None: self.value = self.type.create_meta_pixel_value(self.kwargs)
+        return self.value
+
+
+def clamp(value, low, high):
+    return low if value < low else high if high < value else value
+
+
+class MetaPixelValue:
+    SIZE = 0
+
+    __slots__ = ("type",)
+
+    def __init__(self, value):
+        assert isinstance(value, ValueType)
+        self.type = value
+
+    def get_type(self):
+        return self.type
+
+    def from_colors(self, g: int, b: int):
+        return ()
+
+    def to_colors(self, values):
+        return 0, 0
+
+    def normalize(self, g: int, b: int):
+        return self.to_colors(self.from_colors(g, b))
+
+    def get_help(self):
+        return self.type.name
+
+    def get_color_range(self):
+        return None, None
+
+
+class Bool(MetaPixelValue):
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__(ValueType.Bool)
+
+    def get_help(self):
+        return "If this meta pixel exists it's properties are on"
+
+
+class Vec2(MetaPixelValue):
+    SIZE = 2
+
+    __slots__ = ("midpoint", "range")
+
+    def __init__(self, vec_range=128.0, value=(128.0, 128.0)):
+        super().__init__(ValueType.Vec2)
+        self.midpoint = value
+        self.range = vec_range
+
+    def from_colors(self, g: int, b: int):
+        return clamp(g-self.midpoint[0], -self.range, self.range), clamp(b-self.midpoint[1], -self.range, self.range)
+
+    def to_colors(self, values):
+        return values[0]+self.midpoint[0], values[1]+self.midpoint[1]
+
+    def get_color_range(self):
+        return (max(0, int(self.midpoint[0]-self.range)), min(255, int(self.midpoint[0]+self.range))), \
+               (max(0, int(self.midpoint[1]-self.range)), min(255, int(self.midpoint[1]+self.range)))
+
+    def get_help(self):
+        return str(self.midpoint[0])+" is 0, negative numbers are below that value & positive above. This Vec2 has a " \
+                                     "range of " \
+               + str(self.range)+" which means the min & max are ("+str(self.midpoint[0]-self.range)+", "\
+               + str(self.midpoint[1]+self.range)+")"
+
+
+class Float(MetaPixelValue):
+    SIZE = 1
+
+    __slots__ = ("range",)
+
+    def __init__(self, float_range=1.0, value=1.0):
+        super().__init__(ValueType.Float)
+        self.range = float_range
+
+    def from_colors(self, g: int, b: int):
+        return (g / 255) * self.range,
+
+    def to_colors(self, values):
+        return round(255 * (values[0] / self.range)), 0
+
+    def get_color_range(self):
+        return (0, 255), None
+
+    def get_help(self):
+        return "0 through 255 will be translated into a number between two values. For this float those two values are"\
+               + " 0.0 to "+str(self.range)+"."
+
+
+class Int(MetaPixelValue):
+    SIZE = 1
+
+    __slots__ = ("range",)
+
+    def __init__(self, int_range=255, value=0):
+        super().__init__(ValueType.Int)
+        self.range = int_range
+
+    def from_colors(self, g: int, b: int):
+        return clamp(g, 0, self.range),
+
+    def to_colors(self, values):
+        return values[0], 0
+
+    def get_color_range(self):
+        return (0, min(255, self.range)), None
+
+    def get_help(self):
+        return "The green RGB value is the value of the integer. This integer has a max value of "+str(self.range)
+
+
+class IntPair(MetaPixelValue):
+    SIZE = 2
+
+    __slots__ = ("range_x", "range_y")
+
+    def __init__(self, int_range_x=255, int_range_y=255, value_x=0, value_y=0):
+        super().__init__(ValueType.IntPair)
+        self.range_x = int_range_x
+        self.range_y = int_range_y
+
+    def from_colors(self, g: int, b: int):
+        return clamp(g, 0, self.range_x), clamp(b, 0, self.range_y)
+
+    def to_colors(self, values):
+        return values[0], values[1]
+
+    def get_color_range(self):
+        return (0, min(255, self.range_x)), (0, min(255, self.range_y))
+
+    def get_help(self):
+        return "The green RGB value is the first value of the integer, the second is the blue RGB value. This IntPair "\
+               + "has a max value A & max value B of "+str((self.range_x, self.range_y))
+
+
+class NormalizedVec2(MetaPixelValue):
+    SIZE = 2
+
+    __slots__ = ("offset", "negative", "range")
+
+    def __init__(self, vec_range=1.0, value=(0.0, 0.0), allow_negative=True):
+        super().__init__(ValueType.NormVec2)
+        self.offset = (128.0, 128.0) if allow_negative else (0.0, 0.0)
+        self.negative = allow_negative
+        self.range = vec_range
+
+    def from_colors(self, g: int, b: int):
+        value_x = (g - self.offset[0]) / 255 * self.range
+        value_y = (b - self.offset[1]) / 255 * self.range
+        if self.negative:
+            if value_x < -self.range/2: value_x = -self.range/2
+            elif self.range/2 < value_x: value_x = self.range/2
+
+            if value_y < -self.range/2: value_y = -self.range/2
+            elif self.range/2 < value_y: value_y = self.range/2
+        else:
+            if value_x < 0: value_x = 0
+            elif self.range < value_x: value_x = self.range
+
+            if value_y < -self.range / 2: value_y = -self.range / 2
+            elif self.range < value_y: value_y = self.range / 2
+        return value_x, value_y
+
+    def to_colors(self, values):
+        return round(255 * (values[0] / self.range)+self.offset[0]), \
+            round(255 * (values[1] / self.range)+self.offset[1])
+
+    def get_color_range(self):
+        return (0, 255), (0, 255)
+
+    def get_help(self):
+        range_min = -self.range/2 if self.negative else 0.0
+        range_max = self.range/2 if self.negative else self.range
+
+        return "A vector that behaves like a float where the green & blue RGB values (0 through 255) are turned into" \
+               " a different number range. For this NormalizedVec2 that is ("+str(range_min)+", "+str(range_max)+")"
+
+
+class Randomize(MetaPixelValue):
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__(ValueType.Randomize)
+
+    def normalize(self, g: int, b: int):
+        return g, b
+
+    def get_color_range(self):
+        return (0, 255), (0, 255)
+
+
+class MetaPixelType(enum.Enum):
+    # Misc
+    HatOffset = 1, TypeHolder(ValueType.Vec2, vec_range=16), \
+    "Hat offset position in pixels", 0
+
+    UseDuckColor = 2, TypeHolder(ValueType.Bool), \
+    "If this metapixel exists, White (255, 255, 255) and Grey(157, 157, 157) will be recolored to duck colors.", 0
+
+    # Capes
+    CapeOffset = 10, TypeHolder(ValueType.Vec2, vec_range=16), \
+    "Cape offset position in pixels", 1
+
+    CapeForeground = 11, TypeHolder(ValueType.Bool), \
+    "If this metapixel exists, the cape will be drawn over the duck.", 1
+
+    CapeSwayModifier = 12, TypeHolder(ValueType.NormVec2, value=(0.3, 1.0)), \
+    "Affects cape length, and left to right sway.", 1
+
+    CapeWiggleModifier = 13, TypeHolder(ValueType.NormVec2, value=(1.0, 1.0)), \
+    "Affects how much the cape wiggles in the wind.", 1
+
+    CapeTaperStart = 14, TypeHolder(ValueType.Float, value=0.5), \
+    "Affects how narrow the cape/trail is at the top/beginning.", 1
+
+    CapeTaperEnd = 15, TypeHolder(ValueType.Float), \
+    "Affects how narrow the cape/trail is at the bottom/end.", 1
+
+    CapeAlphaStart = 16, TypeHolder(ValueType.Float), \
+    "Affects how transparent the cape/trail is at the top/beginning.", 1
+
+    CapeAlphaEnd = 17, TypeHolder(ValueType.Float), \
+    "Affects how transparent the cape/trail is at the bottom/end.", 1
+
+    CapeIsTrail = 20, TypeHolder(ValueType.Bool), \
+    "If this metapixel exists, the cape will be a trail instead of a cape (think of the rainbow trail left by the " \
+    "TV object).", 1
+
+    # Particles
+    ParticleEmitterOffset = 30, TypeHolder(ValueType.Vec2, vec_range=16.0), \
+    "The offset in pixels from the center of the hat where particles will be emitted.", 2
+
+    ParticleDefaultBehavior = 31, TypeHolder(ValueType.Int, int_range=4, value=0), \
+    "B defines a particle behavior from a list of presets: 0 = No Behavior, 1 = Spit, 2 = Burst," \
+    " 3 = Halo, 4 = Exclamation", 2
+
+    ParticleEmitShape = 32, TypeHolder(ValueType.IntPair, int_range_x=2, int_range_y=2), \
+    "G: 0 = Point, 1 = Circle, 2 = Box   B: 0 = Emit Around Shape Border Randomly, 1 = Fill Shape Randomly, " \
+    "2 = Emit Around Shape Border Uniformly", 2
+
+    ParticleEmitShapeSize = 33, TypeHolder(ValueType.Vec2, vec_range=24.0, value=(24.0, 24.0)), \
+    "X and Y size of the particle emitter (in pixels). Should be IntPair with usage but is this type in docs.", 2
+
+    ParticleCount = 34, TypeHolder(ValueType.Int, int_range=8, value=4), \
+    "The number of particles to emit.", 2
+
+    ParticleLifespan = 35, TypeHolder(ValueType.Float, float_range=2.0), \
+    "Life span of the particle, in seconds (0 to 2 seconds)", 2
+
+    ParticleVelocity = 36, TypeHolder(ValueType.NormVec2, vec_range=2.0), \
+    "Initial velocity of the particle.", 2
+
+    ParticleGravity = 37, TypeHolder(ValueType.NormVec2, vec_range=2.0), \
+    "Gravity applied to the particle.", 2
+
+    ParticleFriction = 38, TypeHolder(ValueType.NormVec2, vec_range=2.0, allow_negative=False, value=(1.0, 1.0)), \
+    "Friction applied to the particle (The value it's velocity is multiplied by every frame).", 2
+
+    ParticleAlpha = 39, TypeHolder(ValueType.NormVec2, vec_range=2.0, allow_negative=False, value=(1.0, 1.0)), \
+    "G = Start alpha, B = End alpha", 2
+
+    ParticleScale = 40, TypeHolder(ValueType.NormVec2, vec_range=2.0, allow_negative=False, value=(1.0, 0.0)), \
+    "G = Start scale, B = End scale", 2
+
+    ParticleRotation = 41, TypeHolder(ValueType.NormVec2, vec_range=36.0, allow_negative=False, value=(0.0, 0.0)),\
+    "G = Start rotation, B = End rotation", 2
+
+    ParticleOffset = 42, TypeHolder(ValueType.Vec2, vec_range=16), \
+    "Additional X Y offset of particle.", 2
+
+    ParticleBackground = 43, TypeHolder(ValueType.Bool), \
+    "If this metapixel exists, particles will be rendered behind the duck.", 2
+
+    ParticleAnchor = 44, TypeHolder(ValueType.Bool), \
+    "If this metapixel exists, particles will stay anchored around the hat position when it's moving.", 2
+
+    ParticleAnimated = 45, TypeHolder(ValueType.Bool), \
+    "If this metapixel exists, particles will animate through their frames. Otherwise, a frame will be picked " \
+    "randomly.", 2
+
+    ParticleAnimationLoop = 46, TypeHolder(ValueType.Bool), \
+    "If this metapixel exists, the particle animation will loop.", 2
+
+    ParticleAnimationRandomFrame = 47, TypeHolder(ValueType.Bool), \
+    "If this metapixel exists, the particle animation will start on a random frame.", 2
+
+    ParticleAnimationSpeed = 48, TypeHolder(ValueType.Float, value=0.1), \
+    "How quickly the particle animates.", 2
+
+    # Strange
+    WetLips = 70, TypeHolder(ValueType.Bool), \
+    "If this metapixel exists, the hat will have 'wet lips'.", 3
+
+    MechanicalLips = 71, TypeHolder(ValueType.Bool), \
+    "If this metapixel exists, the hat will have 'mechanical lips'.", 3
+
+    # Special
+    RandomizeParameterX = 100, TypeHolder(ValueType.Randomize), \
+    "If present, the previously defined metapixel value will have a random number between G and B applied to its A " \
+    "value each time it's used. This will generally only work with particles..", 4
+
+    RandomizeParameterY = 101, TypeHolder(ValueType.Randomize), \
+    "If present, the previously defined metapixel value will have a random number between G and B applied to its B " \
+    "value each time it's used. This will generally only work with particles..", 4
+
+    RandomizeParameter = 102, TypeHolder(ValueType.Randomize), \
+    "If present, the previously defined metapixel value will have a random number between G and B applied to its " \
+    "A and B values each time it's used. This will generally only work with particles..", 4
+
+    def __reduce_ex__(self, protocol):
+        return getattr, (MetaPixelType, self.name)
+
+
+class MetaPixel:
+
+    TYPES = {
+            1: MetaPixelType.HatOffset,
+            2: MetaPixelType.UseDuckColor,
+            10: MetaPixelType.CapeOffset,
+            11: MetaPixelType.CapeForeground,
+            12: MetaPixelType.CapeSwayModifier,
+            13: MetaPixelType.CapeWiggleModifier,
+            14: MetaPixelType.CapeTaperStart,
+            15: MetaPixelType.CapeTaperEnd,
+            16: MetaPixelType.CapeAlphaStart,
+            17: MetaPixelType.CapeAlphaEnd,
+            20: MetaPixelType.CapeIsTrail,
+            30: MetaPixelType.ParticleEmitterOffset,
+            31: MetaPixelType.ParticleDefaultBehavior,
+            32: MetaPixelType.ParticleEmitShape,
+            33: MetaPixelType.ParticleEmitShapeSize,
+            34: MetaPixelType.ParticleCount,
+            35: MetaPixelType.ParticleLifespan,
+            36: MetaPixelType.ParticleVelocity,
+            37: MetaPixelType.ParticleGravity,
+            38: MetaPixelType.ParticleFriction,
+            39: MetaPixelType.ParticleAlpha,
+            40: MetaPixelType.ParticleScale,
+            41: MetaPixelType.ParticleRotation,
+            42: MetaPixelType.ParticleOffset,
+            43: MetaPixelType.ParticleBackground,
+            44: MetaPixelType.ParticleAnchor,
+            45: MetaPixelType.ParticleAnimated,
+            46: MetaPixelType.ParticleAnimationLoop,
+            47: MetaPixelType.ParticleAnimationRandomFrame,
+            48: MetaPixelType.ParticleAnimationSpeed,
+            70: MetaPixelType.WetLips,
+            71: MetaPixelType.MechanicalLips,
+            100: MetaPixelType.RandomizeParameterX,
+            101: MetaPixelType.RandomizeParameterY,
+            102: MetaPixelType.RandomizeParameter
+        }
+
+    COLORS = {
+        0: "Gold",
+        1: "LightSkyBlue",
+        2: "PaleGreen",
+        3: "Wheat1",
+        4: "HotPink"
+    }
+    CATEGORIES = {
+        0: "Misc",
+        1: "Capes",
+        2: "Particles",
+        3: "Strange",
+        4: "Special"
+    }
+
+    __slots__ = ("type", "value", "g", "b")
+
+    def __init__(self, meta_pixel_type: MetaPixelType, g, b):
+        assert isinstance(meta_pixel_type, MetaPixelType)
+        self.type = meta_pixel_type
+
+        value = meta_pixel_type.value[1]
+        assert isinstance(value, TypeHolder)
+        self.value = value.generate()
+
+        self.g = g
+        self.b = b
+
+    def set_colors(self, g: int, b: int):
+        self.g = g
+        self.b = b
+
+    def set_value(self, a: float, b: float):
+        if self.value.SIZE == 0: return
+        self.g, self.b = get_tables(self.type).to_colors(a, b)
+
+    def get_colors(self):
+        return self.value.normalize(self.g, self.b)
+
+    def get_rgba(self):
+        gb = self.get_colors()
+        r, g, b, a = int(self.type.value[0]), int(gb[0]), int(gb[1]), 255
+        g = 0 if g < 0 else 255 if 255 < g else g
+        b = 0 if b < 0 else 255 if 255 < b else b
+        return r, g, b, a
+
+    def get_value(self):
+        return self.value.from_colors(self.g, self.b)
+
+
+class ValueTables:
+    __slots__ = ("size", "value_a", "value_b", "color_g", "color_b")
+
+    def __init__(self, value: MetaPixelValue):
+        self.size = value.SIZE
+        values = [value.from_colors(c, c) for c in range(256)]
+        colors = [value.normalize(c, c) for c in range(256)]
+        self.value_a = self.make_array([v[0] for v in values]) if 0 < self.size else None
+        self.value_b = self.make_array([v[1] for v in values]) if 1 < self.size else None
+        self.color_g = bytes(clamp(int(c[0]), 0, 255) for c in colors)
+        self.color_b = bytes(clamp(int(c[1]), 0, 255) for c in colors)
+
+    @staticmethod
+    def make_array(values):
+        return array('i' if all(isinstance(v, int) for v in values) else 'd', values)
+
+    def decode(self, g: int, b: int):
+        if self.size == 0: return ()
+        if self.size == 1: return self.value_a[g],
+        return self.value_a[g], self.value_b[b]
+
+    def encode(self, g: int, b: int):
+        return self.color_g[g], self.color_b[b]
+
+    @staticmethod
+    def nearest(table, value: float):
+        i = bisect_left(table, value)
+        if i == len(table) or (0 < i and value-table[i-1] <= table[i]-value): return i-1
+        return i
+
+    def to_colors(self, a=0.0, b=0.0):
+        if self.size == 0: return self.color_g[0], self.color_b[0]
+        g = self.color_g[self.nearest(self.value_a, a)]
+        if self.size == 1: return g, self.color_b[0]
+        return g, self.color_b[self.nearest(self.value_b, b)]
+
+
+TABLES = {}
+
+
+def get_tables(meta_pixel_type: MetaPixelType):
+    tables = TABLES.get(meta_pixel_type)
+    if tables is None: tables = TABLES[meta_pixel_type] = ValueTables(meta_pixel_type.value[1].generate())
+    return tables
@@ -0,0 +1,279 @@
+import math
+import os
+import numpy
+from MetaPixels import MetaPixelType, MetaPixel, get_tables
+from Codec import HatError, open_hat, read_meta_column, meta_rows, output_path
+
+
+FPS = 60
+FRAME_SIZE = (64, 64)
+HAT_FRAME = (0, 0, 32, 32)
+PARTICLE_SIZE = 4
+PARTICLE_COLOR = (255, 255, 255)
+BACKGROUND = (48, 48, 48, 255)
+MAX_PARTICLES = MetaPixelType.ParticleCount.value[1].kwargs["int_range"]
+
+DEFAULTS = {
+    MetaPixelType.ParticleCount: (4, 0.0),
+    MetaPixelType.ParticleLifespan: (1.0, 0.0),
+    MetaPixelType.ParticleFriction: (1.0, 1.0),
+    MetaPixelType.ParticleAlpha: (1.0, 1.0),
+    MetaPixelType.ParticleScale: (1.0, 0.0)
+}
+RANDOMIZE = {
+    MetaPixelType.RandomizeParameterX: (True, False),
+    MetaPixelType.RandomizeParameterY: (False, True),
+    MetaPixelType.RandomizeParameter: (True, True)
+}
+PARAMETERS = (MetaPixelType.ParticleEmitterOffset, MetaPixelType.ParticleEmitShapeSize, MetaPixelType.ParticleLifespan,
+              MetaPixelType.ParticleVelocity, MetaPixelType.ParticleGravity, MetaPixelType.ParticleFriction,
+              MetaPixelType.ParticleAlpha, MetaPixelType.ParticleScale, MetaPixelType.ParticleRotation,
+              MetaPixelType.ParticleOffset)
+
+
+def default_colors(meta_pixel_type: MetaPixelType):
+    meta_pixel = MetaPixel(meta_pixel_type, 0, 0)
+    meta_pixel.set_value(*DEFAULTS.get(meta_pixel_type, (0.0, 0.0)))
+    return meta_pixel.get_rgba()[1:3]
+
+
+def value_arrays(meta_pixel_type: MetaPixelType):
+    tables = get_tables(meta_pixel_type)
+    zeros = numpy.zeros(256)
+    return (zeros if tables.value_a is None else numpy.array(tables.value_a, dtype=numpy.float64),
+            zeros if tables.value_b is None else numpy.array(tables.value_b, dtype=numpy.float64))
+
+
+COLORS = {meta_pixel_type: default_colors(meta_pixel_type) for meta_pixel_type in PARAMETERS}
+VALUES = {meta_pixel_type: value_arrays(meta_pixel_type) for meta_pixel_type in PARAMETERS}
+
+
+class Emitter:
+    __slots__ = ("active", "count", "shape", "fill", "background", "colors", "ranges")
+
+    def __init__(self, rows):
+        self.colors = {}
+        self.ranges = {}
+        previous = None
+        for meta_pixel_type, g, b in rows:
+            axes = RANDOMIZE.get(meta_pixel_type)
+            if axes is None:
+                self.colors[meta_pixel_type] = g, b
+                previous = meta_pixel_type
+            elif previous is not None:
+                ranges = self.ranges.setdefault(previous, [0, 0, 0, 0])
+                if axes[0]: ranges[0:2] = g, b
+                if axes[1]: ranges[2:4] = g, b
+
+        self.active = any(meta_pixel_type.value[3] == 2 for meta_pixel_type in self.colors)
+        self.count = self.decode(MetaPixelType.ParticleCount)[0]
+        self.shape, self.fill = self.decode(MetaPixelType.ParticleEmitShape)
+        self.background = MetaPixelType.ParticleBackground in self.colors
+
+    @staticmethod
+    def from_meta_pixels(meta_pixels):
+        return Emitter((meta_pixel.type,)+meta_pixel.get_rgba()[1:3] for meta_pixel in meta_pixels)
+
+    @staticmethod
+    def from_column(data: bytes):
+        return Emitter(meta_rows(data))
+
+    def color(self, meta_pixel_type: MetaPixelType):
+        colors = self.colors.get(meta_pixel_type)
+        return COLORS[meta_pixel_type] if colors is None else colors
+
+    def decode(self, meta_pixel_type: MetaPixelType):
+        colors = self.colors.get(meta_pixel_type)
+        if colors is None: colors = default_colors(meta_pixel_type)
+        return get_tables(meta_pixel_type).decode(*colors)
+
+
+class ParticleSystem:
+    def __init__(self, emitters, seed=None):
+        self.emitters = emitters
+        self.random = numpy.random.default_rng(seed)
+        self.frame = 0
+
+        counts = numpy.array([emitter.count if emitter.active else 0 for emitter in emitters], dtype=numpy.intp)
+        self.owner = numpy.repeat(numpy.arange(len(emitters)), counts)
+        self.slot = numpy.arange(len(self.owner))-numpy.repeat(numpy.cumsum(counts)-counts, counts)
+        self.count = counts[self.owner]
+        self.shape = numpy.array([emitter.shape for emitter in emitters], dtype=numpy.intp)[self.owner]
+        self.fill = numpy.array([emitter.fill for emitter in emitters], dtype=numpy.intp)[self.owner]
+        self.colors = {meta_pixel_type: numpy.array([emitter.color(meta_pixel_type) for emitter in emitters],
+                                                    dtype=numpy.float64).reshape(-1, 2)
+                       for meta_pixel_type in PARAMETERS}
+        self.ranges = {meta_pixel_type: numpy.array([emitter.ranges.get(meta_pixel_type, (0, 0, 0, 0))
+                                                     for emitter in emitters], dtype=numpy.float64).reshape(-1, 4)
+                       for meta_pixel_type in PARAMETERS}
+
+        size = len(self.owner)
+        self.born = numpy.zeros(size, dtype=bool)
+        for name in ("age", "life", "x", "y", "vx", "vy", "gx", "gy", "fx", "fy", "alpha_start", "alpha_end",
+                     "scale_start", "scale_end", "rotation_start", "rotation_end"):
+            setattr(self, name, numpy.zeros(size))
+
+        index = numpy.arange(size)
+        self.spawn(index)
+        self.born[:] = False
+        self.age = -self.life*self.slot/numpy.maximum(self.count, 1)
+
+    def sample_colors(self, meta_pixel_type: MetaPixelType, index):
+        owner = self.owner[index]
+        colors = self.colors[meta_pixel_type][owner]
+        ranges = self.ranges[meta_pixel_type][owner]
+        g = colors[:, 0]+self.random.uniform(ranges[:, 0], ranges[:, 1])
+        b = colors[:, 1]+self.random.uniform(ranges[:, 2], ranges[:, 3])
+        return numpy.clip(g, 0, 255).astype(numpy.intp), numpy.clip(b, 0, 255).astype(numpy.intp)
+
+    def sample(self, meta_pixel_type: MetaPixelType, index):
+        g, b = self.sample_colors(meta_pixel_type, index)
+        value_a, value_b = VALUES[meta_pixel_type]
+        return value_a[g], value_b[b]
+
+    def shape_positions(self, index):
+        width, height = self.sample_colors(MetaPixelType.ParticleEmitShapeSize, index)
+        shape, fill = self.shape[index], self.fill[index]
+        u, v = self.random.random(len(index)), self.random.random(len(index))
+        t = numpy.where(fill == 2, (self.slot[index]+0.5)/numpy.maximum(self.count[index], 1), u)
+
+        angle = 2*math.pi*t
+        radius = numpy.where(fill == 1, numpy.sqrt(v), 1.0)
+        circle_x, circle_y = numpy.cos(angle)*radius*width/2, numpy.sin(angle)*radius*height/2
+
+        p = t*2*(width+height)
+        edges = [p < width, p < width+height, p < 2*width+height]
+        border_x = numpy.select(edges, [p-width/2, width/2, width/2-(p-width-height)], -width/2)
+        border_y = numpy.select(edges, [-height/2, p-width-height/2, height/2], height/2-(p-2*width-height))
+        box_x = numpy.where(fill == 1, (u-0.5)*width, border_x)
+        box_y = numpy.where(fill == 1, (v-0.5)*height, border_y)
+
+        return numpy.select([shape == 1, shape == 2], [circle_x, box_x], 0.0), \
+            numpy.select([shape == 1, shape == 2], [circle_y, box_y], 0.0)
+
+    def spawn(self, index):
+        self.life[index] = numpy.maximum(self.sample(MetaPixelType.ParticleLifespan, index)[0], 1/FPS)
+        emitter_x, emitter_y = self.sample(MetaPixelType.ParticleEmitterOffset, index)
+        offset_x, offset_y = self.sample(MetaPixelType.ParticleOffset, index)
+        shape_x, shape_y = self.shape_positions(index)
+        self.x[index] = emitter_x+offset_x+shape_x
+        self.y[index] = emitter_y+offset_y+shape_y
+        self.vx[index], self.vy[index] = self.sample(MetaPixelType.ParticleVelocity, index)
+        self.gx[index], self.gy[index] = self.sample(MetaPixelType.ParticleGravity, index)
+        self.fx[index], self.fy[index] = self.sample(MetaPixelType.ParticleFriction, index)
+        self.alpha_start[index], self.alpha_end[index] = self.sample(MetaPixelType.ParticleAlpha, index)
+        self.scale_start[index], self.scale_end[index] = self.sample(MetaPixelType.ParticleScale, index)
+        self.rotation_start[index], self.rotation_end[index] = self.sample(MetaPixelType.ParticleRotation, index)
+        self.born[index] = True
+
+    def step(self):
+        self.vx = (self.vx+self.gx)*self.fx
+        self.vy = (self.vy+self.gy)*self.fy
+        self.x += self.vx
+        self.y += self.vy
+        self.age += 1/FPS
+        self.frame += 1
+
+        expired = self.life <= self.age
+        index = numpy.flatnonzero(expired | ((0 <= self.age) & ~self.born))
+        if not len(index): return
+        self.age[index] = numpy.where(expired[index], self.age[index]-self.life[index], self.age[index])
+        self.spawn(index)
+
+    def progress(self):
+        return numpy.clip(self.age/self.life, 0.0, 1.0)
+
+    def alpha(self):
+        progress = self.progress()
+        alpha = self.alpha_start+(self.alpha_end-self.alpha_start)*progress
+        return numpy.where(self.born, numpy.clip(alpha, 0.0, 1.0), 0.0)
+
+    def scale(self):
+        return self.scale_start+(self.scale_end-self.scale_start)*self.progress()
+
+    def rotation(self):
+        return self.rotation_start+(self.rotation_end-self.rotation_start)*self.progress()
+
+    def corners(self, scale=1.0):
+        size = self.scale()*PARTICLE_SIZE*scale/2
+        rotation = self.rotation()
+        x = (FRAME_SIZE[0]/2+self.x)*scale
+        y = (FRAME_SIZE[1]/2+self.y)*scale
+        corners = []
+        for corner in range(4):
+            angle = rotation+math.pi/4+corner*math.pi/2
+            corners += [x+numpy.cos(angle)*size*math.sqrt(2), y+numpy.sin(angle)*size*math.sqrt(2)]
+        return numpy.stack(corners, axis=1)
+
+    def render(self):
+        width, height = FRAME_SIZE
+        frames = numpy.zeros((len(self.emitters), height, width), dtype=numpy.float32)
+        alpha = self.alpha()
+        inside = (numpy.abs(self.x) < width) & (numpy.abs(self.y) < height)
+        visible = numpy.flatnonzero((0 < alpha) & inside)
+        owner, alpha = self.owner[visible], alpha[visible]
+        x = numpy.rint(width/2+self.x[visible]).astype(numpy.intp)
+        y = numpy.rint(height/2+self.y[visible]).astype(numpy.intp)
+        radius = numpy.rint(numpy.abs(self.scale()[visible])*PARTICLE_SIZE/2).astype(numpy.intp)
+        for dy in range(-PARTICLE_SIZE, PARTICLE_SIZE+1):
+            for dx in range(-PARTICLE_SIZE, PARTICLE_SIZE+1):
+                mask = (abs(dx) <= radius) & (abs(dy) <= radius) & (0 <= x+dx) & (x+dx < width) & (0 <= y+dy) & \
+                       (y+dy < height)
+                numpy.maximum.at(frames, (owner[mask], y[mask]+dy, x[mask]+dx), alpha[mask])
+        return frames
+
+
+def simulate(emitters, frames: int, every=1, seed=0):
+    system = ParticleSystem(emitters, seed)
+    for _ in range(FPS): system.step()
+    rendered = []
+    for frame in range(frames*every):
+        system.step()
+        if frame % every == every-1: rendered.append(system.render())
+    return numpy.stack(rendered, axis=1)
+
+
+def compose_strip(frames, hat, background: bool, scale=1):
+    from PIL import Image
+    width, height = FRAME_SIZE
+    strip = Image.new('RGBA', (width*len(frames), height), BACKGROUND)
+    for i, alpha in enumerate(frames):
+        pixels = numpy.empty((height, width, 4), dtype=numpy.uint8)
+        pixels[..., :3] = PARTICLE_COLOR
+        pixels[..., 3] = numpy.rint(alpha*255)
+        frame = Image.new('RGBA', FRAME_SIZE, (0, 0, 0, 0))
+        particles = Image.fromarray(pixels, 'RGBA')
+        if background: frame.alpha_composite(particles)
+        if hat is not None: frame.alpha_composite(hat, ((width-hat.width)//2, (height-hat.height)//2))
+        if not background: frame.alpha_composite(particles)
+        strip.alpha_composite(frame, (width*i, 0))
+    if scale != 1: strip = strip.resize((strip.width*scale, strip.height*scale), Image.NEAREST)
+    return strip
+
+
+def render_strips(paths, output, root, frames=12, every=5, scale=1, seed=0):
+    results = []
+    emitters = []
+    hats = []
+    for path in paths:
+        try:
+            image = open_hat(path)
+            emitter = Emitter.from_column(read_meta_column(image))
+            hat = image.crop(HAT_FRAME) if emitter.active else None
+        except (HatError, OSError) as error:
+            results.append((path, None, str(error)))
+            continue
+        results.append((path, None, None))
+        if emitter.active:
+            emitters.append(emitter)
+            hats.append((len(results)-1, hat))
+    if not emitters: return results
+
+    rendered = simulate(emitters, frames, every, seed)
+    for (result, hat), alphas, emitter in zip(hats, rendered, emitters):
+        path = results[result][0]
+        target = os.path.splitext(output_path(path, root, output))[0]+".particles.png"
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        compose_strip(alphas, hat, emitter.background, scale).save(target)
+        results[result] = path, target, None
+    return results
@@ -0,0 +1,88 @@
+import re
+from MetaPixels import ValueType, MetaPixelType, MetaPixel
+from Codec import ZLIB_LEVEL, HatError, open_meta_column, decode_meta_bytes, encode_meta_bytes, write_meta_column
+
+
+ACTIONS = ("set", "offset", "clamp", "remove")
+OPERATION = re.compile(r"^(\w+)\s+(\w+)\s*(?:=\s*|\s)?\s*(.*)$")
+
+
+class PatchError(ValueError):
+    pass
+
+
+class Operation:
+    __slots__ = ("action", "type", "values")
+
+    def __init__(self, action: str, meta_pixel_type: MetaPixelType, values=()):
+        self.action = action
+        self.type = meta_pixel_type
+        self.values = tuple(values)
+
+    def __str__(self):
+        return self.action+" "+self.type.name+("="+",".join(str(value) for value in self.values) if self.values else "")
+
+    def change(self, values):
+        values = list(values)+[0.0]*(2-len(values))
+        if self.action == "set":
+            for i, value in enumerate(self.values[:2]): values[i] = value
+        elif self.action == "offset":
+            for i, value in enumerate(self.values[:2]): values[i] += value
+        elif self.action == "clamp":
+            low, high = self.values
+            values = [low if value < low else high if high < value else value for value in values]
+        return values
+
+    def apply(self, meta_pixels):
+        if self.action == "remove":
+            return [meta_pixel for meta_pixel in meta_pixels if meta_pixel.type is not self.type]
+
+        found = [meta_pixel for meta_pixel in meta_pixels if meta_pixel.type is self.type]
+        if not found and self.action == "set":
+            found = [MetaPixel(self.type, 0, 0)]
+            meta_pixels = meta_pixels+found
+        for meta_pixel in found: meta_pixel.set_value(*self.change(meta_pixel.get_value()))
+        return meta_pixels
+
+
+def parse_operation(text: str):
+    match = OPERATION.match(text.strip())
+    if match is None: raise PatchError("Can't understand "+repr(text))
+    action, name, values = match.group(1).lower(), match.group(2), match.group(3).strip()
+    if action not in ACTIONS: raise PatchError("Unknown action "+repr(action)+", use one of "+", ".join(ACTIONS))
+
+    meta_pixel_type = MetaPixelType.__members__.get(name)
+    if meta_pixel_type is None: raise PatchError("Unknown MetaPixelType "+repr(name))
+    try:
+        values = [float(value) for value in values.split(",")] if values else []
+    except ValueError:
+        raise PatchError("Values of "+repr(text)+" need to be numbers separated by commas")
+
+    value = meta_pixel_type.value[1].generate()
+    if action != "remove" and value.type == ValueType.Randomize:
+        raise PatchError(meta_pixel_type.name+" randomizes the MetaPixel before it so it can only be removed")
+    if action in ("offset", "clamp") and value.SIZE == 0:
+        raise PatchError(meta_pixel_type.name+" doesn't have any values to "+action)
+    if action in ("set", "offset") and value.SIZE < len(values):
+        raise PatchError(meta_pixel_type.name+" only has "+str(value.SIZE)+" values")
+    if action == "offset" and not values: raise PatchError("offset needs at least one value")
+    if action == "clamp" and len(values) != 2: raise PatchError("clamp needs a minimum & maximum value")
+    if action == "remove" and values: raise PatchError("remove doesn't take values")
+    return Operation(action, meta_pixel_type, values)
+
+
+def patch_hat(path, operations, dry_run=False, level=ZLIB_LEVEL):
+    try:
+        column = open_meta_column(path)
+        meta_pixels = decode_meta_bytes(column)
+        before = encode_meta_bytes(meta_pixels)
+        for operation in operations: meta_pixels = operation.apply(meta_pixels)
+        after = encode_meta_bytes(meta_pixels)
+        if before == after: return {"path": path, "changed": False}
+        if not dry_run: write_meta_column(path, meta_pixels, level=level)
+    except (HatError, OSError) as error:
+        return {"path": path, "error": str(error)}
+
+    return {"path": path, "changed": True, "written": not dry_run,
+            "before": [list(before[p:p+3]) for p in range(0, len(before), 4) if before[p+3]],
+            "after": [list(after[p:p+3]) for p in range(0, len(after), 4) if after[p+3]]}
@@ -0,0 +1,100 @@
+import hashlib
+import io
+import json
+import os
+import numpy
+from MetaPixels import MetaPixelType
+from Codec import HatError, META_COLUMN, open_hat, read_meta_column, meta_rows, write_file, output_path
+
+
+MANIFEST = "thumbnails.json"
+MANIFEST_VERSION = 1
+
+HAT_FRAME = (0, 0, 32, 32)
+QUACK_FRAME = (32, 0, 64, 32)
+GIF_BACKGROUND = (255, 255, 255)
+GIF_DURATION = 400
+
+DUCK_WHITE = (255, 255, 255)
+DUCK_GREY = (157, 157, 157)
+DUCK_COLORS = {
+    "white": (255, 255, 255),
+    "grey": (125, 125, 125),
+    "yellow": (247, 224, 90),
+    "orange": (205, 107, 29)
+}
+
+# Row 0 keeps the pixels that aren't White or Grey, rows 1 & 2 are the light & dark shade of every duck
+PALETTES = numpy.array([[(0, 0, 0), color, tuple(round(c*DUCK_GREY[0]/DUCK_WHITE[0]) for c in color)]
+                        for color in DUCK_COLORS.values()], dtype=numpy.uint8)
+
+
+def recolor(pixels):
+    rgb = pixels[..., :3]
+    shades = numpy.all(rgb == DUCK_WHITE, axis=-1)+2*numpy.all(rgb == DUCK_GREY, axis=-1)
+    mask = 0 < shades
+    recolored = numpy.repeat(pixels[numpy.newaxis], len(PALETTES), axis=0)
+    recolored[:, mask, :3] = PALETTES[:, shades[mask]]
+    return recolored
+
+
+def hat_frames(pixels, duck_color: bool):
+    sheets = recolor(pixels) if duck_color else pixels[numpy.newaxis]
+    return [sheets[:, y0:y1, x0:x1] for x0, y0, x1, y1 in (HAT_FRAME, QUACK_FRAME)]
+
+
+def compose_row(frames, scale: int):
+    row = numpy.concatenate(list(frames), axis=1)
+    return row.repeat(scale, axis=0).repeat(scale, axis=1)
+
+
+def thumbnail_targets(path, output, root):
+    name = os.path.splitext(output_path(path, root, output))[0]
+    return name+".thumb.png", name+".thumb.gif"
+
+
+def load_manifest(output, settings):
+    try:
+        with open(os.path.join(output, MANIFEST)) as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("settings") != settings: return {}
+    return manifest.get("hats", {})
+
+
+def save_manifest(output, settings, hats):
+    manifest = {"version": MANIFEST_VERSION, "settings": settings, "hats": hats}
+    write_file(os.path.join(output, MANIFEST), json.dumps(manifest, indent=1, sort_keys=True).encode())
+
+
+def render_thumbnail(path, output, root, scale=1, digest=None):
+    from PIL import Image
+    with open(path, 'rb') as file:
+        data = file.read()
+    current = hashlib.sha1(data).hexdigest()
+    targets = thumbnail_targets(path, output, root)
+    if current == digest and all(os.path.exists(target) for target in targets): return path, current, None, None
+    os.makedirs(os.path.dirname(targets[0]), exist_ok=True)
+
+    image = open_hat(io.BytesIO(data))
+    duck_color = any(meta_pixel_type == MetaPixelType.UseDuckColor
+                     for meta_pixel_type, g, b in meta_rows(read_meta_column(image)))
+    pixels = numpy.asarray(image)[:, :META_COLUMN]
+    hat, quack = (compose_row(frames, scale) for frames in hat_frames(pixels, duck_color))
+    Image.fromarray(hat, 'RGBA').save(targets[0])
+
+    background = Image.new('RGBA', (hat.shape[1], hat.shape[0]), GIF_BACKGROUND+(255,))
+    frames = [Image.alpha_composite(background, Image.fromarray(row, 'RGBA')).convert('RGB') for row in (hat, quack)]
+    frames[0].save(targets[1], save_all=True, append_images=frames[1:], duration=GIF_DURATION, loop=0)
+    return path, current, targets, None
+
+
+def render_thumbnails(items, output, root, scale=1):
+    results = []
+    for path, digest in items:
+        try:
+            results.append(render_thumbnail(path, output, root, scale, digest))
+        except (HatError, OSError) as error:
+            results.append((path, None, None, str(error)))
+    return results
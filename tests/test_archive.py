@@ -0,0 +1,88 @@
+import io
+import os
+import random
+import sys
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from PIL import Image
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from MetaPixels import MetaPixelType, MetaPixel
+from Codec import HAT_SIZE, encode_meta_column, encode_meta_bytes, open_meta_column
+from Archive import rewrite_archive
+
+
+def make_hat(rng, meta_pixels):
+    image = Image.frombytes('RGBA', HAT_SIZE, bytes(rng.randrange(256) for _ in range(HAT_SIZE[0]*HAT_SIZE[1]*4)))
+    encode_meta_column(image, meta_pixels)
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    return output.getvalue()
+
+
+def raw_member(archive, info):
+    with open(archive.filename, 'rb') as file:
+        file.seek(info.header_offset+26)
+        name_length, extra_length = int.from_bytes(file.read(2), 'little'), int.from_bytes(file.read(2), 'little')
+        file.seek(info.header_offset+30+name_length+extra_length)
+        return file.read(info.compress_size)
+
+
+class RewriteArchiveTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(12)
+        self.directory = tempfile.TemporaryDirectory()
+        self.members = {
+            "hats/edited.png": make_hat(rng, [MetaPixel(MetaPixelType.ParticleCount, 2, 0)]),
+            "hats/stored.png": make_hat(rng, [MetaPixel(MetaPixelType.CapeIsTrail, 0, 0)]),
+            "hats/deflated.png": make_hat(rng, [MetaPixel(MetaPixelType.HatOffset, 120, 130)]),
+            "readme.txt": b"not a hat"
+        }
+        self.edits = {"hats/edited.png": [MetaPixel(MetaPixelType.ParticleCount, 6, 0)],
+                      "hats/deflated.png": [MetaPixel(MetaPixelType.HatOffset, 120, 130)]}
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def edit(self, name):
+        return self.edits.get(name)
+
+    def test_zip(self):
+        with zipfile.ZipFile(self.path("hats.zip"), 'w') as archive:
+            for name, data in self.members.items():
+                archive.writestr(name, data, zipfile.ZIP_STORED if "stored" in name else zipfile.ZIP_DEFLATED)
+
+        self.assertEqual(rewrite_archive(self.path("hats.zip"), self.path("out.zip"), self.edit), 1)
+        with zipfile.ZipFile(self.path("hats.zip")) as source, zipfile.ZipFile(self.path("out.zip")) as output:
+            self.assertIsNone(output.testzip())
+            self.assertEqual(output.namelist(), source.namelist())
+            for info in output.infolist():
+                self.assertEqual(info.compress_type, source.getinfo(info.filename).compress_type)
+                if info.filename == "hats/edited.png": continue
+                self.assertEqual(output.read(info), self.members[info.filename])
+                self.assertEqual(raw_member(output, info), raw_member(source, source.getinfo(info.filename)))
+            edited = output.read("hats/edited.png")
+        self.assertEqual(open_meta_column(io.BytesIO(edited)), encode_meta_bytes(self.edits["hats/edited.png"]))
+
+    def test_tar(self):
+        with tarfile.open(self.path("hats.tar.gz"), 'w:gz') as archive:
+            for name, data in self.members.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+
+        self.assertEqual(rewrite_archive(self.path("hats.tar.gz"), self.path("out.tar.gz"), self.edit), 1)
+        with tarfile.open(self.path("out.tar.gz")) as output:
+            self.assertEqual(output.getnames(), list(self.members))
+            for name, data in self.members.items():
+                rewritten = output.extractfile(name).read()
+                if name != "hats/edited.png": self.assertEqual(rewritten, data)
+                else: self.assertEqual(open_meta_column(io.BytesIO(rewritten)), encode_meta_bytes(self.edits[name]))
+
+
+if __name__ == '__main__':
+    unittest.main()
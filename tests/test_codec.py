@@ -0,0 +1,109 @@
+import io
+import os
+import random
+import struct
+import sys
+import unittest
+import zlib
+from PIL import Image
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from MetaPixels import MetaPixelType, MetaPixel
+from Codec import HAT_SIZE, META_ROWS, PNG_SIGNATURE, encode_meta_column, encode_meta_bytes, encode_meta_png, \
+    patch_meta_png, paeth, read_chunks, write_chunks
+
+
+def random_meta_pixels(rng, count: int):
+    types = [meta_pixel_type for meta_pixel_type in MetaPixelType if meta_pixel_type.value[0] < 100]
+    return [MetaPixel(rng.choice(types), rng.randrange(256), rng.randrange(256)) for _ in range(count)]
+
+
+def random_image(rng, mode='RGBA'):
+    image = Image.frombytes('RGBA', HAT_SIZE, bytes(rng.randrange(256) for _ in range(HAT_SIZE[0]*HAT_SIZE[1]*4)))
+    return image if mode == 'RGBA' else image.convert(mode)
+
+
+def save_png(image, **options):
+    output = io.BytesIO()
+    image.save(output, format="PNG", **options)
+    return output.getvalue()
+
+
+def filter_png(image, filter_types, idat_chunks=1):
+    width, height = image.size
+    pixels = image.tobytes()
+    stride = width*4
+    filtered = bytearray()
+    prior = bytes(stride)
+    for y in range(height):
+        row = pixels[y*stride:(y+1)*stride]
+        filter_type = filter_types[y % len(filter_types)]
+        filtered.append(filter_type)
+        for i in range(stride):
+            a = row[i-4] if 4 <= i else 0
+            c = prior[i-4] if 4 <= i else 0
+            predicted = (0, a, prior[i], (a+prior[i]) >> 1, paeth(a, prior[i], c))[filter_type]
+            filtered.append((row[i]-predicted) & 255)
+        prior = row
+
+    compressed = zlib.compress(bytes(filtered))
+    size = len(compressed)//idat_chunks+1
+    chunks = [(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)), (b'tEXt', b'Comment\0hat')]
+    chunks += [(b'IDAT', compressed[i:i+size]) for i in range(0, len(compressed), size)]
+    return write_chunks(chunks+[(b'IEND', b'')])
+
+
+def expected_pixels(data, meta_pixels):
+    image = Image.open(io.BytesIO(data)).convert('RGBA')
+    encode_meta_column(image, meta_pixels)
+    return image.tobytes()
+
+
+class PatchMetaPngTest(unittest.TestCase):
+    def assert_patched(self, data, meta_pixels):
+        patched = patch_meta_png(data, encode_meta_bytes(meta_pixels))
+        self.assertIsNotNone(patched)
+        self.assertTrue(patched.startswith(PNG_SIGNATURE))
+        with Image.open(io.BytesIO(patched)) as image:
+            self.assertEqual(image.mode, 'RGBA')
+            self.assertEqual(image.tobytes(), expected_pixels(data, meta_pixels))
+        return patched
+
+    def test_pillow_hats(self):
+        rng = random.Random(0)
+        for level in (0, 1, 9):
+            data = save_png(random_image(rng), compress_level=level)
+            for count in (0, 1, 17, META_ROWS):
+                self.assert_patched(data, random_meta_pixels(rng, count))
+
+    def test_every_filter_type(self):
+        rng = random.Random(1)
+        for filter_types in ((0,), (1,), (2,), (3,), (4,), (0, 1, 2, 3, 4), (4, 2, 3, 1)):
+            self.assert_patched(filter_png(random_image(rng), filter_types), random_meta_pixels(rng, 20))
+
+    def test_multiple_idat_chunks(self):
+        rng = random.Random(2)
+        data = filter_png(random_image(rng), (4, 1, 2), idat_chunks=5)
+        self.assertEqual([chunk_type for chunk_type, body in read_chunks(data)].count(b'IDAT'), 5)
+        patched = self.assert_patched(data, random_meta_pixels(rng, 30))
+        self.assertEqual([chunk_type for chunk_type, body in read_chunks(patched)],
+                         [b'IHDR', b'tEXt', b'IDAT', b'IEND'])
+
+    def test_unchanged_column(self):
+        rng = random.Random(3)
+        meta_pixels = random_meta_pixels(rng, 12)
+        data = self.assert_patched(save_png(random_image(rng)), meta_pixels)
+        self.assertIs(patch_meta_png(data, encode_meta_bytes(meta_pixels)), data)
+        self.assertIs(encode_meta_png(data, meta_pixels), data)
+
+    def test_palette_fallback(self):
+        rng = random.Random(4)
+        data = save_png(random_image(rng, 'P'))
+        meta_pixels = random_meta_pixels(rng, 8)
+        self.assertIsNone(patch_meta_png(data, encode_meta_bytes(meta_pixels)))
+        encoded = encode_meta_png(data, meta_pixels)
+        with Image.open(io.BytesIO(encoded)) as image:
+            self.assertEqual(image.convert('RGBA').tobytes(), expected_pixels(data, meta_pixels))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import os
+import random
+import sys
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from MetaPixels import MetaPixelType, MetaPixel
+from History import ADD, REMOVE, MOVE, SWAP, CHANGE, History, inverse, apply_record
+
+
+def rgba(meta_pixels):
+    return [meta_pixel.get_rgba() for meta_pixel in meta_pixels]
+
+
+class Document:
+    def __init__(self, meta_pixels, limit=None):
+        self.meta_pixels = meta_pixels
+        self.history = History(limit)
+
+    def replay(self, record, undo: bool):
+        apply_record(self.meta_pixels, inverse(record) if undo else record)
+
+    def add(self, meta_pixel):
+        self.meta_pixels.append(meta_pixel)
+        self.history.add(len(self.meta_pixels)-1, meta_pixel.get_rgba())
+
+    def remove(self, index: int):
+        self.history.remove(index, self.meta_pixels.pop(index).get_rgba())
+
+    def move(self, index: int, position: int):
+        self.meta_pixels.insert(position, self.meta_pixels.pop(index))
+        self.history.move(index, position)
+
+    def swap(self, i: int, u: int):
+        self.meta_pixels[i], self.meta_pixels[u] = self.meta_pixels[u], self.meta_pixels[i]
+        self.history.swap(i, u)
+
+    def change(self, index: int, g: int, b: int, field=2):
+        old = self.meta_pixels[index].get_rgba()
+        self.meta_pixels[index].set_colors(g, b)
+        self.history.change(index, old, self.meta_pixels[index].get_rgba(), field)
+
+    def undo(self):
+        return self.history.undo(self.replay)
+
+    def redo(self):
+        return self.history.redo(self.replay)
+
+
+class InverseTest(unittest.TestCase):
+    def test_inverse(self):
+        self.assertEqual(inverse((ADD, 2, 0, 34, 4, 0, 4, 0)), (REMOVE, 2, 0, 34, 4, 0, 4, 0))
+        self.assertEqual(inverse((REMOVE, 2, 0, 34, 4, 0, 4, 0)), (ADD, 2, 0, 34, 4, 0, 4, 0))
+        self.assertEqual(inverse((MOVE, 1, 3, 0, 0, 0, 0, 0)), (MOVE, 3, 1, 0, 0, 0, 0, 0))
+        self.assertEqual(inverse((SWAP, 1, 3, 0, 0, 0, 0, 0)), (SWAP, 1, 3, 0, 0, 0, 0, 0))
+        self.assertEqual(inverse((CHANGE, 1, 0, 34, 4, 0, 6, 0)), (CHANGE, 1, 0, 34, 6, 0, 4, 0))
+
+    def test_apply_inverse_restores(self):
+        rng = random.Random(24)
+        for op in (ADD, REMOVE, MOVE, SWAP, CHANGE):
+            meta_pixels = [MetaPixel(MetaPixelType.ParticleCount, g, 0) for g in range(5)]
+            before = rgba(meta_pixels)
+            index, target = rng.randrange(5), rng.randrange(5)
+            old = meta_pixels[index].get_rgba()
+            new = old[1:3] if op == REMOVE else (7, 0)
+            record = (op, index, target, 34, old[1], old[2])+new if op != ADD else (op, index, 0, 34, 7, 0, 7, 0)
+            apply_record(meta_pixels, record)
+            apply_record(meta_pixels, inverse(record))
+            self.assertEqual(rgba(meta_pixels), before, op)
+
+
+class HistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.document = Document([MetaPixel(MetaPixelType.ParticleCount, 4, 0),
+                                  MetaPixel(MetaPixelType.HatOffset, 128, 128),
+                                  MetaPixel(MetaPixelType.CapeIsTrail, 0, 0)])
+
+    def test_undo_redo(self):
+        document = self.document
+        states = [rgba(document.meta_pixels)]
+        for edit in (lambda: document.add(MetaPixel(MetaPixelType.ParticleLifespan, 40, 0)),
+                     lambda: document.change(1, 130, 128), lambda: document.move(0, 3), lambda: document.swap(0, 2),
+                     lambda: document.remove(1), lambda: document.change(0, 120, 140, 3)):
+            edit()
+            states.append(rgba(document.meta_pixels))
+        self.assertEqual(len(document.history), 6)
+
+        for state in reversed(states[:-1]):
+            self.assertTrue(document.undo())
+            self.assertEqual(rgba(document.meta_pixels), state)
+        self.assertFalse(document.undo())
+        for state in states[1:]:
+            self.assertTrue(document.redo())
+            self.assertEqual(rgba(document.meta_pixels), state)
+        self.assertFalse(document.redo())
+
+    def test_changes_coalesce(self):
+        document = self.document
+        for g in (1, 13, 130): document.change(1, g, 128)
+        document.change(1, 130, 140, 3)
+        self.assertEqual(len(document.history), 2)
+        document.undo()
+        self.assertEqual(rgba(document.meta_pixels)[1], (1, 130, 128, 255))
+        document.undo()
+        self.assertEqual(rgba(document.meta_pixels)[1], (1, 128, 128, 255))
+
+    def test_change_back_cancels(self):
+        document = self.document
+        document.change(1, 130, 128)
+        document.change(1, 128, 128)
+        self.assertEqual(len(document.history), 0)
+
+    def test_undo_breaks_coalescing_and_drops_redo(self):
+        document = self.document
+        document.change(1, 130, 128)
+        document.undo()
+        document.change(1, 140, 128)
+        document.change(1, 150, 128)
+        self.assertEqual(len(document.history), 1)
+        self.assertFalse(document.redo())
+        document.undo()
+        self.assertEqual(rgba(document.meta_pixels)[1], (1, 128, 128, 255))
+
+    def test_no_op_edits_are_not_recorded(self):
+        document = self.document
+        document.swap(1, 1)
+        document.change(0, 4, 0)
+        self.assertEqual(len(document.history), 0)
+
+    def test_listener_sees_every_edit(self):
+        document = self.document
+        shadow = [MetaPixel(meta_pixel.type, meta_pixel.g, meta_pixel.b) for meta_pixel in document.meta_pixels]
+        document.history.listener = lambda record: apply_record(shadow, record)
+        for g in (1, 13, 130): document.change(1, g, 128)
+        document.move(2, 0)
+        document.remove(1)
+        document.undo()
+        document.undo()
+        document.redo()
+        self.assertEqual(rgba(shadow), rgba(document.meta_pixels))
+
+    def test_limit(self):
+        document = Document([MetaPixel(MetaPixelType.CapeTaperStart, 0, 0)], limit=10)
+        for g in range(1, 40): document.change(0, g, 0, field=g % 2+2)
+        self.assertLessEqual(len(document.history), 11)
+        self.assertEqual(len(document.history.records), len(document.history)*8)
+        while document.undo(): pass
+        self.assertEqual(rgba(document.meta_pixels), [(14, 39-len(document.history.records)//8, 0, 255)])
+
+
+if __name__ == '__main__':
+    unittest.main()
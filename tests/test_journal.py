@@ -0,0 +1,119 @@
+import os
+import struct
+import sys
+import tempfile
+import time
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from MetaPixels import MetaPixelType, MetaPixel
+from Codec import encode_meta_bytes
+from History import ADD, REMOVE, MOVE, SWAP, CHANGE, RECORD_SIZE, apply_record
+from Journal import JOURNAL_MAGIC, COLUMN_SIZE, Journal, journal_path, read_journal, replay_journal, find_journals, \
+    lock_journal, unlock_journal
+
+
+META_PIXELS = [MetaPixel(MetaPixelType.ParticleCount, 4, 0), MetaPixel(MetaPixelType.HatOffset, 128, 128),
+               MetaPixel(MetaPixelType.CapeIsTrail, 0, 0), MetaPixel(MetaPixelType.CapeIsTrail, 0, 0)]
+RECORDS = [(CHANGE, 0, 0, 34, 4, 0, 6, 0), (ADD, 4, 0, 35, 40, 0, 40, 0), (MOVE, 4, 1, 0, 0, 0, 0, 0),
+           (SWAP, 0, 2, 0, 0, 0, 0, 0), (REMOVE, 3, 0, 20, 0, 0, 0, 0), (CHANGE, 2, 0, 1, 128, 128, 130, 120)]
+
+
+def rgba(meta_pixels):
+    return [meta_pixel.get_rgba() for meta_pixel in meta_pixels]
+
+
+def expected(records):
+    meta_pixels = [MetaPixel(meta_pixel.type, meta_pixel.g, meta_pixel.b) for meta_pixel in META_PIXELS]
+    for record in records: apply_record(meta_pixels, record)
+    return rgba(meta_pixels)
+
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.hat = os.path.join(self.directory.name, "hat.png")
+        self.column = encode_meta_bytes(META_PIXELS)
+        Journal.FLUSH_INTERVAL = 0.01
+
+    def tearDown(self):
+        Journal.FLUSH_INTERVAL = 1.0
+        self.directory.cleanup()
+
+    def write(self, records, close=True):
+        journal = Journal(self.hat, self.column, self.directory.name)
+        for record in records: journal.append(bytes(record))
+        if close: journal.close()
+        return journal
+
+    def test_header(self):
+        journal = self.write(RECORDS[:1])
+        self.assertEqual(journal.path, journal_path(self.hat, self.directory.name))
+        with open(journal.path, 'rb') as file:
+            data = file.read()
+        encoded = os.path.abspath(self.hat).encode("utf-8")
+        self.assertEqual(data, JOURNAL_MAGIC+struct.pack('>H', len(encoded))+encoded+self.column+bytes(RECORDS[0]))
+        self.assertEqual(len(self.column), COLUMN_SIZE)
+
+    def test_read_and_replay(self):
+        journal = self.write(RECORDS)
+        hat_path, column, records = read_journal(journal.path)
+        self.assertEqual((hat_path, column, records), (os.path.abspath(self.hat), self.column, RECORDS))
+        self.assertEqual(rgba(replay_journal(column, records)), expected(RECORDS))
+
+    def test_truncated_record(self):
+        journal = self.write(RECORDS)
+        size = os.path.getsize(journal.path)
+        with open(journal.path, 'r+b') as file:
+            file.truncate(size-RECORD_SIZE*2-3)
+        hat_path, column, records = read_journal(journal.path)
+        self.assertEqual(records, RECORDS[:-3])
+        self.assertEqual(rgba(replay_journal(column, records)), expected(RECORDS[:-3]))
+
+    def test_truncated_header(self):
+        journal = self.write(RECORDS)
+        with open(journal.path, 'r+b') as file:
+            file.truncate(40)
+        self.assertIsNone(read_journal(journal.path))
+        with open(journal.path, 'wb') as file:
+            file.write(b"nonsense")
+        self.assertIsNone(read_journal(journal.path))
+        self.assertIsNone(read_journal(journal.path+".missing"))
+
+    def test_replay_stops_at_bad_records(self):
+        records = RECORDS[:2]+[(REMOVE, 40, 0, 0, 0, 0, 0, 0)]+RECORDS[2:]
+        self.assertEqual(rgba(replay_journal(self.column, records)), expected(RECORDS[:2]))
+
+    def test_restart_and_close(self):
+        journal = self.write(RECORDS, close=False)
+        other = os.path.join(self.directory.name, "other.png")
+        journal.restart(other, self.column)
+        journal.append(bytes(RECORDS[0]))
+        journal.close()
+        self.assertEqual(find_journals(self.directory.name), [journal_path(other, self.directory.name)])
+        self.assertEqual(read_journal(journal.path)[2], RECORDS[:1])
+
+        journal = self.write(RECORDS, close=False)
+        journal.close(delete=True)
+        self.assertFalse(os.path.exists(journal.path))
+
+    def test_lock_contention(self):
+        journal = self.write(RECORDS, close=False)
+        try:
+            while not os.path.exists(journal.path): time.sleep(0.01)
+            self.assertIsNone(lock_journal(journal.path))
+            second = self.write(RECORDS[:1])
+            self.assertIsInstance(second.error, OSError)
+        finally:
+            journal.close()
+        self.assertIsNone(journal.error)
+        handle = lock_journal(journal.path)
+        self.assertIsNotNone(handle)
+        self.assertIsNone(lock_journal(journal.path))
+        unlock_journal(handle)
+        handle = lock_journal(journal.path)
+        self.assertIsNotNone(handle)
+        unlock_journal(handle)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+from PIL import Image
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from MetaPixels import MetaPixelType, MetaPixel
+from Codec import HAT_SIZE, encode_meta_column
+import Library
+from Library import QueryError, LibraryIndex
+
+
+HATS = {
+    "four.png": [MetaPixel(MetaPixelType.ParticleCount, 4, 0), MetaPixel(MetaPixelType.HatOffset, 130, 120)],
+    "six.png": [MetaPixel(MetaPixelType.ParticleCount, 6, 0)],
+    "trail.png": [MetaPixel(MetaPixelType.CapeIsTrail, 0, 0)]
+}
+
+
+class LibraryIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = self.directory.name
+        for name, meta_pixels in HATS.items():
+            image = Image.new('RGBA', HAT_SIZE, (255, 255, 255, 255))
+            encode_meta_column(image, meta_pixels)
+            image.save(self.path(name))
+        Image.new('RGBA', HAT_SIZE, (255, 255, 255, 255)).convert('P').save(self.path("pal.png"))
+        Image.new('RGBA', (16, 16)).save(self.path("notahat.png"))
+        with open(self.path("bad.png"), 'wb') as file:
+            file.write(b"not a png at all")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def index(self):
+        index = LibraryIndex(self.root).load()
+        index.update()
+        return index
+
+    def query(self, expression):
+        index = self.index()
+        found = [os.path.basename(path) for path in index.query(expression)]
+        with mock.patch.object(Library, "load_numpy", lambda: None):
+            self.assertEqual([os.path.basename(path) for path in index.query(expression)], found, expression)
+        return found
+
+    def test_presence(self):
+        self.assertEqual(self.query("ParticleCount"), ["four.png", "six.png"])
+        self.assertEqual(self.query("CapeIsTrail or HatOffset"), ["four.png", "trail.png"])
+
+    def test_comparisons_skip_hats_without_the_type(self):
+        self.assertEqual(self.query("ParticleCount != 4"), ["six.png"])
+        self.assertEqual(self.query("ParticleCount < 5"), ["four.png"])
+        self.assertEqual(self.query("HatOffset.y = -8 and ParticleCount >= 4"), ["four.png"])
+
+    def test_not_skips_unreadable_files(self):
+        self.assertEqual(self.query("not ParticleCount"), ["pal.png", "trail.png"])
+        self.assertEqual(self.query("not ParticleCount > 4"), ["four.png", "pal.png", "trail.png"])
+
+    def test_bad_queries(self):
+        index = self.index()
+        for expression in ("ParticleCount ~ 4", "NoSuchType", "CapeIsTrail > 1"):
+            self.assertRaises(QueryError, index.query, expression)
+
+    def test_missing_files_rebuild_the_index(self):
+        self.index()
+        for name in (MetaPixelType.ParticleCount.name+".col", "paths.txt", "stats.bin"):
+            os.remove(os.path.join(self.root, Library.INDEX_DIRECTORY, name))
+            index = LibraryIndex(self.root).load()
+            self.assertEqual(index.paths, [])
+            self.assertEqual(index.update(), len(HATS)+3)
+            self.assertEqual([os.path.basename(path) for path in index.query("ParticleCount")], ["four.png", "six.png"])
+
+    def test_unchanged_hats_are_not_read_again(self):
+        self.index()
+        self.assertEqual(self.index().update(), 0)
+        self.assertEqual(self.query("not ParticleCount"), ["pal.png", "trail.png"])
+
+
+if __name__ == '__main__':
+    unittest.main()
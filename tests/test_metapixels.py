@@ -0,0 +1,59 @@
+import os
+import random
+import sys
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from MetaPixels import MetaPixelType, MetaPixel, get_tables
+
+
+VALUE_TYPES = [meta_pixel_type for meta_pixel_type in MetaPixelType if get_tables(meta_pixel_type).size]
+
+
+class ValueTablesTest(unittest.TestCase):
+    def test_encode_is_idempotent(self):
+        for meta_pixel_type in MetaPixelType:
+            tables = get_tables(meta_pixel_type)
+            for c in range(256):
+                g, b = tables.encode(c, c)
+                self.assertEqual(tables.encode(g, b), (g, b), meta_pixel_type.name)
+
+    def test_to_colors_inverts_decode(self):
+        for meta_pixel_type in VALUE_TYPES:
+            tables = get_tables(meta_pixel_type)
+            for c in range(256):
+                g, b = tables.encode(c, c)
+                self.assertEqual(tables.to_colors(*tables.decode(g, b)), (g, b if 1 < tables.size else 0),
+                                 meta_pixel_type.name)
+
+    def test_to_colors_rounds_to_nearest(self):
+        self.assertEqual(get_tables(MetaPixelType.ParticleLifespan).to_colors(0.3125), (40, 0))
+        self.assertEqual(get_tables(MetaPixelType.ParticleVelocity).to_colors(0.5, 0.0), (192, 128))
+        self.assertEqual(get_tables(MetaPixelType.ParticleCount).to_colors(2.6), (3, 0))
+
+    def test_to_colors_clamps_out_of_range_values(self):
+        tables = get_tables(MetaPixelType.HatOffset)
+        self.assertEqual(tables.to_colors(-100.0, 100.0), (tables.encode(0, 0)[0], tables.encode(255, 255)[1]))
+
+
+class SetValueTest(unittest.TestCase):
+    def test_set_value_matches_tables(self):
+        rng = random.Random(10)
+        for meta_pixel_type in VALUE_TYPES:
+            tables = get_tables(meta_pixel_type)
+            for _ in range(100):
+                a, b = rng.uniform(-40.0, 40.0), rng.uniform(-40.0, 40.0)
+                meta_pixel = MetaPixel(meta_pixel_type, 0, 0)
+                meta_pixel.set_value(a, b)
+                self.assertEqual(meta_pixel.get_rgba()[1:3], tables.to_colors(a, b), meta_pixel_type.name)
+
+    def test_set_value_keeps_decoded_values(self):
+        for meta_pixel_type in VALUE_TYPES:
+            for c in range(256):
+                meta_pixel = MetaPixel(meta_pixel_type, c, c)
+                rgba = meta_pixel.get_rgba()
+                meta_pixel.set_value(*(meta_pixel.get_value()+(0.0, 0.0))[:2])
+                self.assertEqual(meta_pixel.get_rgba(), rgba, meta_pixel_type.name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import sys
+import unittest
+import warnings
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from MetaPixels import MetaPixelType, MetaPixel
+try:
+    import numpy
+    import Particles
+except ImportError:
+    Particles = None
+
+
+def emitter(values):
+    meta_pixels = []
+    for meta_pixel_type, value in values.items():
+        meta_pixel = MetaPixel(meta_pixel_type, 0, 0)
+        meta_pixel.set_value(*value)
+        meta_pixels.append(meta_pixel)
+    return Particles.Emitter.from_meta_pixels(meta_pixels)
+
+
+@unittest.skipIf(Particles is None, "needs NumPy")
+class SimulateTest(unittest.TestCase):
+    def test_renders_particles(self):
+        frames = Particles.simulate([emitter({MetaPixelType.ParticleCount: (8, 0)})], 4, 5)
+        self.assertEqual(frames.shape, (1, 4, Particles.FRAME_SIZE[1], Particles.FRAME_SIZE[0]))
+        self.assertTrue(0 < frames.max() <= 1)
+
+    def test_runaway_particles_leave_the_frame(self):
+        runaway = emitter({MetaPixelType.ParticleCount: (8, 0), MetaPixelType.ParticleFriction: (2.0, 2.0),
+                           MetaPixelType.ParticleLifespan: (2.0, 0.0), MetaPixelType.ParticleVelocity: (1.0, 1.0)})
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            frames = Particles.simulate([runaway], 12, 10)
+        self.assertTrue(numpy.isfinite(frames).all())
+        self.assertEqual(frames[0, -1].max(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import sys
+import tempfile
+import unittest
+from PIL import Image
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from MetaPixels import MetaPixelType, MetaPixel
+from Codec import HAT_SIZE, encode_meta_column, open_meta_column, decode_meta_bytes
+from Patch import PatchError, parse_operation, patch_hat
+
+
+def rgba(meta_pixels):
+    return [meta_pixel.get_rgba() for meta_pixel in meta_pixels]
+
+
+def apply(texts, meta_pixels):
+    for text in texts: meta_pixels = parse_operation(text).apply(meta_pixels)
+    return meta_pixels
+
+
+class ParseOperationTest(unittest.TestCase):
+    def test_parses(self):
+        operation = parse_operation("  offset HatOffset +1, -2.5 ")
+        self.assertEqual((operation.action, operation.type, operation.values),
+                         ("offset", MetaPixelType.HatOffset, (1.0, -2.5)))
+        self.assertEqual(str(parse_operation("SET ParticleCount=4")), "set ParticleCount=4.0")
+        self.assertEqual(parse_operation("remove CapeIsTrail").values, ())
+
+    def test_errors(self):
+        for text in ("", "set", "scale HatOffset 2", "set NoSuchType=1", "set HatOffset=a,b", "offset HatOffset",
+                     "clamp HatOffset 1", "remove HatOffset 1", "offset CapeIsTrail 1", "clamp CapeIsTrail 0,1",
+                     "set CapeIsTrail=1", "set ParticleCount=1,2", "set RandomizeParameter",
+                     "offset RandomizeParameterX 1"):
+            self.assertRaises(PatchError, parse_operation, text)
+
+    def test_randomize_can_be_removed(self):
+        meta_pixels = [MetaPixel(MetaPixelType.ParticleCount, 4, 0), MetaPixel(MetaPixelType.RandomizeParameter, 3, 9)]
+        self.assertEqual(rgba(apply(["remove RandomizeParameter"], meta_pixels)), [(34, 4, 0, 255)])
+
+
+class ApplyTest(unittest.TestCase):
+    def test_vec2(self):
+        meta_pixels = [MetaPixel(MetaPixelType.HatOffset, 128, 128)]
+        self.assertEqual(rgba(apply(["set HatOffset=2,-3"], meta_pixels)), [(1, 130, 125, 255)])
+        self.assertEqual(rgba(apply(["offset HatOffset 1"], meta_pixels)), [(1, 131, 125, 255)])
+        self.assertEqual(rgba(apply(["clamp HatOffset -2,2"], meta_pixels)), [(1, 130, 126, 255)])
+        self.assertEqual(rgba(apply(["offset HatOffset 100,-100"], meta_pixels)), [(1, 144, 112, 255)])
+
+    def test_set_adds_missing_meta_pixels(self):
+        meta_pixels = apply(["set CapeIsTrail", "set HatOffset=1"], [])
+        self.assertEqual(rgba(meta_pixels), [(20, 0, 0, 255), (1, 129, 112, 255)])
+        self.assertEqual(rgba(apply(["set CapeIsTrail"], meta_pixels)), rgba(meta_pixels))
+
+    def test_operations_only_touch_their_type(self):
+        meta_pixels = [MetaPixel(MetaPixelType.CapeOffset, 128, 128), MetaPixel(MetaPixelType.CapeIsTrail, 0, 0),
+                       MetaPixel(MetaPixelType.CapeOffset, 120, 136)]
+        meta_pixels = apply(["offset CapeOffset 2,2", "remove CapeIsTrail"], meta_pixels)
+        self.assertEqual(rgba(meta_pixels), [(10, 130, 130, 255), (10, 122, 138, 255)])
+
+
+class PatchHatTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "hat.png")
+        image = Image.new('RGBA', HAT_SIZE, (255, 255, 255, 255))
+        encode_meta_column(image, [MetaPixel(MetaPixelType.ParticleCount, 4, 0)])
+        image.save(self.path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def read(self):
+        with open(self.path, 'rb') as file:
+            return file.read()
+
+    def test_dry_run_leaves_the_file_alone(self):
+        before = self.read()
+        result = patch_hat(self.path, [parse_operation("set ParticleCount=6")], dry_run=True)
+        self.assertEqual((result["changed"], result["written"]), (True, False))
+        self.assertEqual(result["after"], [[34, 6, 0]])
+        self.assertEqual(self.read(), before)
+
+    def test_writes_changes(self):
+        result = patch_hat(self.path, [parse_operation("set ParticleCount=6"), parse_operation("set CapeIsTrail")])
+        self.assertEqual((result["changed"], result["written"]), (True, True))
+        self.assertEqual(rgba(decode_meta_bytes(open_meta_column(self.path))), [(34, 6, 0, 255), (20, 0, 0, 255)])
+
+    def test_unchanged_hats_are_not_written(self):
+        before = self.read()
+        self.assertEqual(patch_hat(self.path, [parse_operation("clamp ParticleCount 0,8")])["changed"], False)
+        self.assertEqual(self.read(), before)
+
+    def test_errors_are_reported(self):
+        with open(self.path, 'wb') as file:
+            file.write(b"broken")
+        self.assertIn("error", patch_hat(self.path, [parse_operation("set ParticleCount=6")]))
+
+
+if __name__ == '__main__':
+    unittest.main()